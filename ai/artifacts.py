@@ -0,0 +1,222 @@
+import os
+import sys
+import json
+import mmap
+import time
+import ctypes
+import hashlib
+import platform
+import numpy as np
+import xgboost as xgb
+from core.state import user_data_path
+
+# 模型快取格式版本：轉換邏輯改變時遞增，舊快取自動失效
+ARTIFACT_VERSION = 1
+
+def sha256_buffer(buf):
+    return hashlib.sha256(buf).hexdigest()
+
+def sha256_file(path):
+    """ 以 mmap 計算檔案 SHA-256 (不需把整個檔案讀進 Python bytes) """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return sha256_buffer(b"")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return sha256_buffer(mm)
+
+def _write_atomic(path, data):
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+def _load_from_mmap(booster, mm):
+    """
+    直接把 mmap 的頁面交給 XGBoost 解析，避免再複製一份 bytearray；
+    ACCESS_COPY 讓 ctypes 取得可寫緩衝區但不會寫回檔案。私有 API 不存在時退回一般路徑。
+    """
+    try:
+        from xgboost.core import _LIB, _check_call, c_bst_ulong
+    except ImportError:
+        booster.load_model(bytearray(mm))
+        return
+    ptr = (ctypes.c_char * len(mm)).from_buffer(mm)
+    try:
+        _check_call(_LIB.XGBoosterLoadModelFromBuffer(booster.handle, ptr, c_bst_ulong(len(mm))))
+    finally:
+        del ptr  # 釋放匯出的緩衝區，mmap 才能關閉
+
+def load_booster(model_path, cache_dir=None):
+    """
+    載入 XGBoost 模型：第一次把 JSON 文字模型轉成二進位 UBJ 並存到使用者資料目錄，
+    之後以來源檔雜湊找到快取、驗證校驗碼後透過 mmap 載入。
+    打包 (onefile) 後每次啟動都解壓到新的暫存目錄，快取仍以內容雜湊命中。
+    回傳: (booster, info)，info 含 load_ms、cached、path
+    """
+    t0 = time.perf_counter()
+    source_sha = sha256_file(model_path)
+    cache_dir = cache_dir or os.path.dirname(user_data_path("models", "_"))
+    os.makedirs(cache_dir, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(model_path))[0]
+    ubj_path = os.path.join(cache_dir, f"{stem}_{source_sha[:16]}.ubj")
+    manifest_path = ubj_path + ".json"
+
+    booster = xgb.Booster()
+    cached = False
+    if os.path.exists(ubj_path) and os.path.exists(manifest_path):
+        try:
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            if manifest.get("version") == ARTIFACT_VERSION and manifest.get("source_sha256") == source_sha \
+                    and manifest.get("xgboost") == xgb.__version__:
+                with open(ubj_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY) as mm:
+                    if sha256_buffer(mm) != manifest.get("ubj_sha256"):
+                        raise ValueError("UBJ 校驗碼不符")
+                    _load_from_mmap(booster, mm)
+                cached = True
+        except Exception as e:
+            print(f"[Artifacts] ⚠️ 模型快取無效 ({e})，重新轉換", flush=True)
+            booster = xgb.Booster()
+
+    if not cached:
+        booster.load_model(model_path)
+        raw = booster.save_raw("ubj")
+        try:
+            _write_atomic(ubj_path, bytes(raw))
+            manifest = {
+                "version": ARTIFACT_VERSION,
+                "source": os.path.basename(model_path),
+                "source_sha256": source_sha,
+                "ubj_sha256": sha256_buffer(raw),
+                "xgboost": xgb.__version__,
+            }
+            _write_atomic(manifest_path, json.dumps(manifest, indent=2).encode("utf-8"))
+        except OSError as e:
+            print(f"[Artifacts] ⚠️ 無法寫入模型快取: {e}", flush=True)
+
+    info = {"load_ms": (time.perf_counter() - t0) * 1000, "cached": cached, "path": ubj_path if cached else model_path}
+    return booster, info
+
+# --- 裝置探測快取 ---
+def _linux_nvidia_fingerprint():
+    """ 讀 /proc：驅動版本行與每張卡的型號 / 匯流排位置，不需初始化 NVML """
+    try:
+        with open("/proc/driver/nvidia/version", "r") as f:
+            driver = f.readline().strip()
+    except OSError:
+        return None
+    gpus = []
+    gpu_dir = "/proc/driver/nvidia/gpus"
+    for bus_id in sorted(os.listdir(gpu_dir)) if os.path.isdir(gpu_dir) else []:
+        try:
+            with open(os.path.join(gpu_dir, bus_id, "information"), "r") as f:
+                model = next((line.split(":", 1)[1].strip() for line in f if line.startswith("Model:")), "")
+        except OSError:
+            model = ""
+        gpus.append(f"{bus_id} {model}".strip())
+    return {"driver": driver, "gpus": gpus}
+
+_DISPLAY_CLASS_KEY = r"SYSTEM\CurrentControlSet\Control\Class\{4d36e968-e325-11ce-bfc1-08002be10318}"
+
+def _windows_nvidia_fingerprint():
+    """ 讀顯示卡類別登錄機碼 (型號 + 驅動版本)，失敗時退回驅動 DLL 的大小與修改時間 """
+    gpus = []
+    try:
+        import winreg
+        with winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, _DISPLAY_CLASS_KEY) as root:
+            for i in range(winreg.QueryInfoKey(root)[0]):
+                try:
+                    with winreg.OpenKey(root, winreg.EnumKey(root, i)) as key:
+                        if "NVIDIA" not in str(winreg.QueryValueEx(key, "ProviderName")[0]).upper():
+                            continue
+                        gpus.append(f"{winreg.QueryValueEx(key, 'DriverDesc')[0]} "
+                                    f"{winreg.QueryValueEx(key, 'DriverVersion')[0]}")
+                except OSError:
+                    continue
+    except (ImportError, OSError):
+        pass
+    if gpus:
+        return {"gpus": sorted(gpus)}
+    dll = os.path.join(os.environ.get("SystemRoot", r"C:\Windows"), "System32", "nvcuda.dll")
+    try:
+        st = os.stat(dll)
+    except OSError:
+        return None
+    return {"driver": f"nvcuda.dll {st.st_size} {int(st.st_mtime)}"}
+
+def _nvidia_fingerprint():
+    """ 顯示卡驅動 / 型號識別，只讀檔案系統或登錄檔 (不初始化 NVML)；無 NVIDIA 時回傳 None """
+    if sys.platform.startswith("linux"):
+        return _linux_nvidia_fingerprint()
+    if sys.platform == "win32":
+        return _windows_nvidia_fingerprint()
+    return None
+
+def _query_vram():
+    """ 顯示卡總記憶體 (GB)；只在探測快取失效時呼叫，結果隨探測結果存檔 """
+    try:
+        import pynvml
+        pynvml.nvmlInit()
+        try:
+            return pynvml.nvmlDeviceGetMemoryInfo(pynvml.nvmlDeviceGetHandleByIndex(0)).total / (1024**3)
+        finally:
+            pynvml.nvmlShutdown()
+    except Exception:
+        return 0
+
+def hardware_fingerprint():
+    """ 決定探測結果是否仍有效的環境識別：驅動、顯示卡、XGBoost 版本與 CUDA 編譯選項 """
+    return {
+        "platform": sys.platform,
+        "machine": platform.machine(),
+        "xgboost": xgb.__version__,
+        "xgboost_cuda": bool(xgb.build_info().get("USE_CUDA", False)),
+        "nvidia": _nvidia_fingerprint(),
+    }
+
+def _smoke_test_cuda(booster, num_features):
+    booster.set_param({"device": "cuda"})
+    booster.predict(xgb.DMatrix(np.zeros((1, num_features), dtype=np.float32)))
+
+def probe_device(booster, cache_path=None, force=False):
+    """
+    回傳 {"device": "gpu"/"cpu", "vram_total": GB, "reason": str, "cached": bool}。
+    CUDA 煙霧測試只在環境識別改變 (換驅動、換卡、升級 XGBoost) 時執行一次，結果存於磁碟；
+    快取結果為 gpu 時仍需對此 booster 設定 device。
+    """
+    cache_path = cache_path or user_data_path("device_probe.json")
+    fingerprint = hardware_fingerprint()
+    if not force and os.path.exists(cache_path):
+        try:
+            with open(cache_path, "r", encoding="utf-8") as f:
+                cached = json.load(f)
+            if cached.get("fingerprint") == fingerprint:
+                result = cached["result"]
+                if result["device"] == "gpu":
+                    booster.set_param({"device": "cuda"})
+                return dict(result, cached=True)
+        except (OSError, ValueError, KeyError):
+            pass
+
+    result = {"device": "cpu", "vram_total": _query_vram() if fingerprint["nvidia"] else 0, "reason": ""}
+    if not fingerprint["xgboost_cuda"]:
+        result["reason"] = "XGBoost 未以 CUDA 編譯"
+    elif not fingerprint["nvidia"]:
+        result["reason"] = "未偵測到 NVIDIA 驅動"
+    else:
+        try:
+            _smoke_test_cuda(booster, booster.num_features())
+            result["device"] = "gpu"
+        except Exception as e:
+            result["reason"] = str(e)
+    if result["device"] == "cpu":
+        try:
+            booster.set_param({"device": "cpu"})
+        except Exception:
+            pass
+    try:
+        _write_atomic(cache_path, json.dumps({"fingerprint": fingerprint, "result": result},
+                                             ensure_ascii=False, indent=2).encode("utf-8"))
+    except OSError:
+        pass
+    return dict(result, cached=False)
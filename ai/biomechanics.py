@@ -0,0 +1,160 @@
+import numpy as np
+
+# 關節角度定義：(端點 A, 頂點 B, 端點 C)，角度為向量 BA 與 BC 的夾角
+JOINT_ANGLES = {
+    "L_Elbow": (11, 13, 15),
+    "R_Elbow": (12, 14, 16),
+    "L_Shoulder": (23, 11, 13),
+    "R_Shoulder": (24, 12, 14),
+    "L_Hip": (11, 23, 25),
+    "R_Hip": (12, 24, 26),
+    "L_Knee": (23, 25, 27),
+    "R_Knee": (24, 26, 28),
+}
+ANGLE_NAMES = tuple(JOINT_ANGLES)
+ANGLE_FEATURE_NAMES = [f"angle_{name}" for name in ANGLE_NAMES]
+_TRIPLETS = np.array(list(JOINT_ANGLES.values()), dtype=np.intp)
+
+# 40 維分類特徵從第 11 點 (左肩) 開始，與 ai.models.FEATURE_LANDMARKS 一致
+FEATURE_OFFSET = 11
+# 關鍵點為歸一化座標，x 需乘上畫面寬高比才是等比例的幾何角度 (640x480)
+DEFAULT_ASPECT = 640 / 480
+
+# 預設的次數計算關節：(彎曲門檻, 伸直門檻)，角度低於前者再高於後者算一次
+DEFAULT_REP_RANGES = {"L_Knee": (110.0, 160.0), "R_Knee": (110.0, 160.0)}
+
+def _angles(xy, triplets, aspect):
+    """
+    xy: (..., N, 2) -> (..., J) 角度 (度)，以 atan2(|叉積|, 內積) 計算，避免 arccos 在 0/180 度附近失準
+    aspect: 畫面寬高比，純量或與批次維度相同形狀的陣列 (每筆樣本各自的來源影片比例)
+    """
+    aspect = np.asarray(aspect, dtype=np.float32)
+    scale = np.stack([aspect, np.ones_like(aspect)], axis=-1)[..., None, :]
+    xy = np.asarray(xy, dtype=np.float32)[..., :2] * scale
+    a = xy[..., triplets[:, 0], :]
+    b = xy[..., triplets[:, 1], :]
+    c = xy[..., triplets[:, 2], :]
+    v1 = a - b
+    v2 = c - b
+    dot = (v1 * v2).sum(axis=-1)
+    cross = v1[..., 0] * v2[..., 1] - v1[..., 1] * v2[..., 0]
+    return np.degrees(np.arctan2(np.abs(cross), dot))
+
+def joint_angles(points, aspect=DEFAULT_ASPECT):
+    """ (33, k) 或批次 (T, 33, k) 關鍵點 -> (8,) 或 (T, 8) 關節角度 (度) """
+    return _angles(points, _TRIPLETS, aspect)
+
+def angle_velocities(angles, timestamps):
+    """ 批次角速度 (度/秒)：angles (T, 8)，timestamps (T,) """
+    angles = np.asarray(angles, dtype=np.float32)
+    if len(angles) < 2:
+        return np.zeros_like(angles)
+    return np.gradient(angles, np.asarray(timestamps, dtype=np.float64), axis=0).astype(np.float32)
+
+def angle_features(X, aspect=DEFAULT_ASPECT):
+    """
+    40 維座標特徵 (N, 40) -> (N, 8) 角度特徵 (除以 180 歸一化)，可直接由既有資料集快取計算
+    aspect: 純量或 (N,) 陣列；訓練資料須傳入各影片實際的寬高比，才會與執行端攝影機算出的角度一致
+    """
+    X = np.asarray(X, dtype=np.float32)
+    xy = X.reshape(X.shape[:-1] + (-1, 2))
+    return _angles(xy, _TRIPLETS - FEATURE_OFFSET, aspect) / 180.0
+
+class JointKinematics:
+    """ 逐幀更新關節角度與角速度 (速度以 EMA 平滑) """
+    def __init__(self, velocity_smoothing=0.5, aspect=DEFAULT_ASPECT):
+        self.alpha = velocity_smoothing
+        self.aspect = aspect
+        self.reset()
+
+    def reset(self):
+        self.angles = None
+        self.velocity = np.zeros(len(ANGLE_NAMES), dtype=np.float32)
+        self.t_prev = None
+
+    def update(self, t, points):
+        angles = joint_angles(points, self.aspect)
+        if self.angles is not None:
+            dt = max(t - self.t_prev, 1e-3)
+            self.velocity = self.alpha * (angles - self.angles) / dt + (1 - self.alpha) * self.velocity
+        self.angles = angles
+        self.t_prev = t
+        return angles, self.velocity
+
+class HoldTimer:
+    """ 靜止維持計時：所有關節角速度低於門檻且標籤不變時持續累計 """
+    def __init__(self, still_deg_s=25.0):
+        self.still_deg_s = still_deg_s
+        self.reset()
+
+    def reset(self):
+        self.start = None
+        self.label = None
+        self.seconds = 0.0
+
+    def update(self, t, velocity, label=None):
+        if float(np.abs(velocity).max()) >= self.still_deg_s or label != self.label:
+            self.start = t
+            self.label = label
+        self.seconds = t - self.start
+        return self.seconds
+
+class RepCounter:
+    """ 單一關節的次數計算 (遲滯狀態機)：角度先低於 low 再回到 high 以上算一次 """
+    def __init__(self, joint, low, high):
+        self.index = ANGLE_NAMES.index(joint)
+        self.low = low
+        self.high = high
+        self.count = 0
+        self.flexed = False
+
+    def update(self, angles):
+        angle = angles[self.index]
+        if not self.flexed and angle < self.low:
+            self.flexed = True
+        elif self.flexed and angle > self.high:
+            self.flexed = False
+            self.count += 1
+        return self.count
+
+class BiomechanicsTracker:
+    """
+    每幀一次向量化計算角度 / 角速度，並以 O(1) 狀態更新維持計時與次數；
+    snapshot() 產生小型字典供教練提示與跨執行緒 / 行程傳遞。
+    """
+    def __init__(self, rep_ranges=None, still_deg_s=25.0, aspect=DEFAULT_ASPECT):
+        self.kinematics = JointKinematics(aspect=aspect)
+        self.hold = HoldTimer(still_deg_s)
+        ranges = DEFAULT_REP_RANGES if rep_ranges is None else rep_ranges
+        self.reps = [RepCounter(joint, low, high) for joint, (low, high) in ranges.items()]
+
+    def reset(self):
+        """ 使用者離開畫面：清除速度與維持計時 (次數保留到整段練習結束) """
+        self.kinematics.reset()
+        self.hold.reset()
+
+    def update(self, t, points, label=None):
+        angles, velocity = self.kinematics.update(t, points)
+        self.hold.update(t, velocity, label)
+        for counter in self.reps:
+            counter.update(angles)
+        return self.snapshot()
+
+    def snapshot(self):
+        return {
+            "angles": self.kinematics.angles,
+            "velocity": self.kinematics.velocity,
+            "hold_s": self.hold.seconds,
+            "reps": {ANGLE_NAMES[c.index]: c.count for c in self.reps},
+        }
+
+def format_metrics(metrics):
+    """ 將 snapshot 轉為給 LLM 的精簡數值描述，例如 L_Knee:172°, R_Knee:95° | 靜止 4.2s | 次數 R_Knee:3 """
+    if not metrics or metrics.get("angles") is None:
+        return ""
+    angle_str = ", ".join(f"{name}:{angle:.0f}°" for name, angle in zip(ANGLE_NAMES, metrics["angles"]))
+    parts = [angle_str, f"靜止 {metrics['hold_s']:.1f}s"]
+    reps = ", ".join(f"{name}:{n}" for name, n in metrics["reps"].items() if n)
+    if reps:
+        parts.append(f"次數 {reps}")
+    return " | ".join(parts)
@@ -0,0 +1,103 @@
+import math
+import numpy as np
+
+NUM_POSE_LANDMARKS = 33
+
+def landmarks_to_array(landmarks):
+    """ MediaPipe NormalizedLandmarkList -> (33, 4) 陣列 [x, y, z, visibility] """
+    return np.array([[lm.x, lm.y, lm.z, lm.visibility] for lm in landmarks.landmark], dtype=np.float32)
+
+def array_to_landmarks(arr):
+    """ (N, 4) 陣列 -> NormalizedLandmarkList，供 mp_drawing 與既有的 .landmark[i] 存取使用 """
+    from mediapipe.framework.formats import landmark_pb2
+    out = landmark_pb2.NormalizedLandmarkList()
+    for x, y, z, v in arr:
+        out.landmark.add(x=float(x), y=float(y), z=float(z), visibility=float(v))
+    return out
+
+def _alpha(dt, cutoff):
+    """ 一階低通濾波係數 (cutoff 可為純量或陣列) """
+    tau = 1.0 / (2 * math.pi * cutoff)
+    return 1.0 / (1.0 + tau / dt)
+
+class OneEuroLandmarkFilter:
+    """
+    向量化 One-Euro 濾波：一次處理全部關鍵點座標。
+    靜止時以低截止頻率抑制抖動，快速移動時依速度提高截止頻率降低延遲；
+    同時保留濾波後的速度，可外插預測略過偵測的影格。
+    """
+    def __init__(self, min_cutoff=1.0, beta=0.5, d_cutoff=1.0, max_predict=0.2):
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self.max_predict = max_predict   # 最長外插時間 (秒)，避免偵測中斷時骨架飄走
+        self.reset()
+
+    def reset(self):
+        self.x = None
+        self.dx = None
+        self.t_prev = None
+
+    @property
+    def ready(self):
+        return self.x is not None
+
+    def update(self, t, points):
+        """ 輸入新的偵測結果 (N, D)，回傳濾波後座標 """
+        points = np.asarray(points, dtype=np.float32)
+        if self.x is None:
+            self.x = points.copy()
+            self.dx = np.zeros_like(points)
+            self.t_prev = t
+            return self.x
+
+        dt = max(t - self.t_prev, 1e-3)
+        dx_raw = (points - self.x) / dt
+        a_d = _alpha(dt, self.d_cutoff)
+        self.dx = a_d * dx_raw + (1 - a_d) * self.dx
+
+        cutoff = self.min_cutoff + self.beta * np.abs(self.dx)
+        a = _alpha(dt, cutoff)
+        self.x = a * points + (1 - a) * self.x
+        self.t_prev = t
+        return self.x
+
+    def predict(self, t):
+        """ 以濾波後速度外插 t 時刻的座標 (不更新內部狀態) """
+        if self.x is None:
+            return None
+        horizon = min(max(t - self.t_prev, 0.0), self.max_predict)
+        return self.x + self.dx * horizon
+
+class LabelHysteresis:
+    """
+    標籤遲滯：新標籤必須連續出現 hold_frames 次才會取代目前標籤，
+    避免分類結果在邊界來回跳動而觸發多餘的教練請求。
+    """
+    def __init__(self, hold_frames=5):
+        self.hold_frames = hold_frames
+        self.reset()
+
+    def reset(self):
+        self.current = None
+        self.candidate = None
+        self.count = 0
+
+    def update(self, label):
+        if self.current is None or label == self.current:
+            self.current = label
+            self.candidate = None
+            self.count = 0
+            return self.current
+
+        if label == self.candidate:
+            self.count += 1
+        else:
+            self.candidate = label
+            self.count = 1
+
+        if self.count >= self.hold_frames:
+            self.current = label
+            self.candidate = None
+            self.count = 0
+        return self.current
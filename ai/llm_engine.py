@@ -1,6 +1,20 @@
 import requests
 import time
 import json
+from ai.biomechanics import format_metrics
+
+def build_coach_query(status, landmarks, metrics=None):
+    """ 將姿勢標籤、座標字典與關節角度摘要 (BiomechanicsTracker.snapshot) 組成給 LLM 的 Prompt """
+    # 將座標字典轉為文字描述，讓 AI 更好判斷
+    # 例如：L_Knee:(0.50, 0.80), R_Knee:(0.52, 0.82)
+    lm_str = ", ".join([f"{k}:({v[0]:.2f}, {v[1]:.2f})" for k, v in landmarks.items()])
+    metrics_str = format_metrics(metrics)
+    return (
+        f"使用者目前姿勢標籤為: {status}。 "
+        f"關鍵點座標(歸一化): {lm_str}。 "
+        + (f"關節角度: {metrics_str}。 " if metrics_str else "")
+        + "請判斷使用者動作哪裡不標準，並給出一句 20 字內的具體修正建議。"
+    )
 
 class GeminiCoach:
     def __init__(self, api_key=""):
@@ -5,6 +5,10 @@ import xgboost as xgb
 import os
 import json # 必須導入此庫以處理標籤檔案
 import sys
+import time
+from ai.filters import OneEuroLandmarkFilter, LabelHysteresis, landmarks_to_array, array_to_landmarks
+from ai.biomechanics import angle_features, ANGLE_FEATURE_NAMES, DEFAULT_ASPECT
+from ai.artifacts import load_booster
 
 def resource_path(relative_path):
     """ 取得資源絕對路徑，相容於開發與 PyInstaller 打包環境 """
@@ -12,16 +16,67 @@ def resource_path(relative_path):
         return os.path.join(sys._MEIPASS, relative_path)
     return os.path.join(os.path.abspath("."), relative_path)
 
+# 分類器輸入：肩膀 (11) 到腳踝 (30) 共 20 個點的 x, y (40 維特徵)
+FEATURE_LANDMARKS = range(11, 31)
+FEATURE_NAMES = [f"{axis}{i}" for i in FEATURE_LANDMARKS for axis in ("x", "y")]
+# 以 --angles 訓練的模型另外附加 8 個關節角度特徵 (48 維)
+ANGLE_MODEL_FEATURES = len(FEATURE_NAMES) + len(ANGLE_FEATURE_NAMES)
+
+# 信心度低於此值時不輸出類別
+CONFIDENCE_THRESHOLD = 0.7
+DEFAULT_LABELS = {0: "姿勢偏移 (預設)", 1: "正確動作 (預設)"}
+
+def load_labels(labels_path):
+    """ 載入標籤 JSON 檔案 (key 轉為整數，因為 XGB 預測結果是數值索引)，失敗時回傳預設標籤 """
+    if not os.path.exists(labels_path):
+        print(f"[AI Engine] ⚠️ 找不到標籤檔案於: {labels_path}")
+        return dict(DEFAULT_LABELS)
+    try:
+        with open(labels_path, 'r', encoding='utf-8') as f:
+            labels = {int(k): v for k, v in json.load(f).items()}
+        print(f"[AI Engine] ✅ 成功載入標籤: {labels}")
+        return labels
+    except Exception as e:
+        print(f"[AI Engine] ❌ 標籤檔案解析失敗: {e}")
+        return dict(DEFAULT_LABELS)
+
+def points_to_features(points, angles=False, aspect=DEFAULT_ASPECT):
+    """ (33, k) 關鍵點陣列 -> 40 維特徵 (向量化版本，供服務端批次使用)；angles=True 時附加角度特徵 """
+    features = np.asarray(points, dtype=np.float32)[FEATURE_LANDMARKS.start:FEATURE_LANDMARKS.stop, :2].reshape(-1)
+    return with_angle_features(features, aspect) if angles else features
+
+def with_angle_features(features, aspect=DEFAULT_ASPECT):
+    """ 40 維 (或 N x 40) 座標特徵後方接上關節角度特徵；aspect 為來源畫面寬高比 """
+    features = np.asarray(features, dtype=np.float32)
+    return np.concatenate([features, angle_features(features, aspect)], axis=-1)
+
+def landmarks_to_features(landmarks):
+    """ 將 MediaPipe 骨架轉為 40 維特徵 (與訓練資料欄位順序一致) """
+    features = []
+    for i in FEATURE_LANDMARKS:
+        lm = landmarks.landmark[i]
+        features.extend([lm.x, lm.y])
+    return features
+
 class PoseEngine:
     """
     處理 MediaPipe Pose 偵測與 XGBoost 姿勢辨識
     """
-    def __init__(self, model_path="yoga_pose_model_RightFoot.json", labels_path="rightfoot.json"):
+    def __init__(self, model_path="yoga_pose_model_RightFoot.json", labels_path="rightfoot.json",
+                 pose_rate_hz=None, smoothing=True, label_hold_frames=5, aspect=DEFAULT_ASPECT):
+        """
+        pose_rate_hz: MediaPipe 偵測頻率上限，None 表示每幀偵測；
+                      略過偵測的影格以濾波器外插骨架，顯示仍維持原幀率
+        smoothing: 是否以 One-Euro 濾波平滑關鍵點
+        label_hold_frames: 分類標籤遲滯所需的連續次數 (0 表示不使用遲滯)
+        aspect: 攝影機畫面寬高比，角度模型的角度特徵需與訓練時的各影片比例一致
+        """
         print("[AI Engine] 正在初始化...", flush=True)
         
         # 轉換為資源路徑
         self.actual_model_path = resource_path(model_path)
         self.actual_labels_path = resource_path(labels_path)
+        self.aspect = aspect
         
         self.mp_pose = mp.solutions.pose
         self.mp_drawing = mp.solutions.drawing_utils
@@ -32,77 +87,129 @@ class PoseEngine:
         )
         self.user_style = self.mp_drawing.DrawingSpec(color=(0, 255, 0), thickness=3, circle_radius=3)
 
-        # 1. 初始化 XGBoost
-        self.classifier = xgb.Booster()
+        # 1. 初始化 XGBoost (首次轉為 UBJ 快取，之後以 mmap 載入)
+        self.load_ms = 0.0
         if os.path.exists(self.actual_model_path):
-            self.classifier.load_model(self.actual_model_path)
+            self.classifier, info = load_booster(self.actual_model_path)
+            self.load_ms = info["load_ms"]
             self.model_loaded = True
-            print(f"[AI Engine] 🚀 成功載入模型: {self.actual_model_path}", flush=True)
+            self.use_angles = self.classifier.num_features() == ANGLE_MODEL_FEATURES
+            source = "UBJ 快取" if info["cached"] else "首次轉換"
+            print(f"[AI Engine] 🚀 成功載入模型: {self.actual_model_path} ({self.load_ms:.1f} ms, {source})", flush=True)
         else:
+            self.classifier = xgb.Booster()
             self.model_loaded = False
+            self.use_angles = False
             print(f"[AI Engine] ⚠️ 找不到模型檔案: {self.actual_model_path}，將只顯示骨架", flush=True)
 
         # 2. 初始化標籤
         self.labels = {}
         self._load_labels()
 
+        # 3. 時序濾波與標籤遲滯
+        self.detect_interval = 1.0 / pose_rate_hz if pose_rate_hz else 0.0
+        self.landmark_filter = OneEuroLandmarkFilter() if smoothing or pose_rate_hz else None
+        self.label_filter = LabelHysteresis(label_hold_frames) if label_hold_frames else None
+        self._next_detect = None   # 下一次偵測的排程時間 (秒)
+        self._last_feedback = "請進入畫面"
+        self._visibility = None
+        self.points = None       # 最近一次骨架的 (33, 4) 陣列，供關節角度等向量化計算
+
     def _load_labels(self):
         """ 載入標籤 JSON 檔案 """
-        if os.path.exists(self.actual_labels_path):
-            try:
-                with open(self.actual_labels_path, 'r', encoding='utf-8') as f:
-                    raw_labels = json.load(f)
-                    # 確保 key 轉換為整數，因為 XGB 預測結果是數值索引
-                    self.labels = {int(k): v for k, v in raw_labels.items()}
-                print(f"[AI Engine] ✅ 成功載入標籤: {self.labels}")
-            except Exception as e:
-                print(f"[AI Engine] ❌ 標籤檔案解析失敗: {e}")
-                self.labels = {0: "姿勢偏移 (預設)", 1: "正確動作 (預設)"}
-        else:
-            print(f"[AI Engine] ⚠️ 找不到標籤檔案於: {self.actual_labels_path}")
-            self.labels = {0: "姿勢偏移 (預設)", 1: "正確動作 (預設)"}
+        self.labels = load_labels(self.actual_labels_path)
 
-    def process(self, frame):
+    def process(self, frame, timestamp=None):
         """
-        處理影格
+        處理影格 (偵測 + 辨識 + 繪製)
+        timestamp: 影格擷取時間 (秒)，未提供時使用 time.monotonic()
         回傳: (標記影像, 骨骼數據, 辨識回饋文字)
         """
         if frame is None: return None, None, "No Signal"
         
-        annotated_frame = frame.copy()
-        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        results = self.pose.process(frame_rgb)
-        
-        feedback = "請進入畫面"
-        skeleton_data = None
+        skeleton_data, detected = self.detect(frame, timestamp)
+        feedback = self.classify(skeleton_data, detected)
+        return self.draw(frame, skeleton_data), skeleton_data, feedback
+
+    def detect(self, frame, timestamp=None):
+        """
+        偵測骨架；未達偵測間隔時以濾波器速度外插
+        回傳: (骨骼數據, 本幀是否實際執行了 MediaPipe)
+        """
+        now = time.monotonic() if timestamp is None else timestamp
+        # 依排程時間而非「距上次偵測」判斷：30 fps 擷取、15 Hz 偵測時影格時間的抖動
+        # 不會讓偵測被推遲到下一幀 (否則實際只剩 10 Hz)
+        if self._next_detect is None or now >= self._next_detect:
+            self._schedule_next(now)
+            return self._detect(frame, now), True
+        if self.landmark_filter is not None and self.landmark_filter.ready:
+            self.points = np.column_stack([self.landmark_filter.predict(now), self._visibility])
+            return array_to_landmarks(self.points), False
+        self.points = None
+        return None, False
+
+    def classify(self, skeleton_data, detected=True):
+        """ 只在實際偵測的影格重新分類，外插影格沿用上一次的辨識結果 """
+        if not detected:
+            return self._last_feedback
+        if skeleton_data is None:
+            self._last_feedback = "請進入畫面"
+        elif self.model_loaded:
+            feedback = self._predict_pose(skeleton_data)
+            if self.label_filter is not None:
+                feedback = self.label_filter.update(feedback)
+            self._last_feedback = feedback
+        else:
+            self._last_feedback = "骨架偵測中..."
+        return self._last_feedback
 
-        if results.pose_landmarks:
-            skeleton_data = results.pose_landmarks
+    def draw(self, frame, skeleton_data):
+        """ 在影格副本上繪製骨架 """
+        annotated_frame = frame.copy()
+        if skeleton_data is not None:
             self.mp_drawing.draw_landmarks(
                 annotated_frame, 
                 skeleton_data, 
                 self.mp_pose.POSE_CONNECTIONS,
                 landmark_drawing_spec=self.user_style
             )
-            
-            # 執行辨識
-            if self.model_loaded:
-                feedback = self._predict_pose(skeleton_data)
-            else:
-                feedback = "骨架偵測中..."
-            
-        return annotated_frame, skeleton_data, feedback
+        return annotated_frame
+
+    def _schedule_next(self, now):
+        """ 排程累加一個間隔；落後超過一個間隔 (卡頓、暫停) 時以目前時間重新對齊，不補跑 """
+        if self._next_detect is None or now - self._next_detect >= self.detect_interval:
+            self._next_detect = now + self.detect_interval
+        else:
+            self._next_detect += self.detect_interval
+
+    def _detect(self, frame, now):
+        """ 執行 MediaPipe 偵測 + 濾波 """
+        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        results = self.pose.process(frame_rgb)
+
+        if not results.pose_landmarks:
+            self.points = None
+            if self.landmark_filter is not None:
+                self.landmark_filter.reset()
+            if self.label_filter is not None:
+                self.label_filter.reset()
+            return None
+
+        skeleton_data = results.pose_landmarks
+        self.points = landmarks_to_array(skeleton_data)
+        if self.landmark_filter is not None:
+            self._visibility = self.points[:, 3]
+            smoothed = self.landmark_filter.update(now, self.points[:, :3])
+            self.points = np.column_stack([smoothed, self._visibility])
+            skeleton_data = array_to_landmarks(self.points)
+        return skeleton_data
 
     def _predict_pose(self, landmarks):
-        """ 根據 20 個關鍵點 (40維特徵) 進行預測 """
+        """ 根據 20 個關鍵點 (40維特徵，角度模型另加 8 維) 進行預測 """
         try:
-            features = []
-            # 提取肩膀 (11) 到腳踝 (30) 的點
-            for i in range(11, 31):
-                lm = landmarks.landmark[i]
-                features.extend([lm.x, lm.y])
-            
-            input_data = np.array([features], dtype=np.float32)
+            input_data = np.array([landmarks_to_features(landmarks)], dtype=np.float32)
+            if self.use_angles:
+                input_data = with_angle_features(input_data, self.aspect)
             data = xgb.DMatrix(input_data)
             preds = self.classifier.predict(data)
             
@@ -110,7 +217,7 @@ class PoseEngine:
             class_idx = np.argmax(preds[0])
             confidence = preds[0][class_idx]
             
-            if confidence > 0.7:
+            if confidence > CONFIDENCE_THRESHOLD:
                 # 這裡會從讀取的 self.labels 中抓取對應文字
                 return self.labels.get(class_idx, f"未知動作 (ID:{class_idx})")
             
@@ -0,0 +1,303 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+
+VIDEO_EXTS = (".mp4", ".avi", ".mov", ".mkv", ".webm")
+
+# --- 1. 影片掃描與內容雜湊 ---
+def scan_videos(data_dir):
+    """
+    掃描資料夾：每個子資料夾名稱即為一個標籤
+    data_dir/正確右平衡/clip01.mp4 -> ("正確右平衡", path)
+    """
+    clips = []
+    for label in sorted(os.listdir(data_dir)):
+        label_dir = os.path.join(data_dir, label)
+        if not os.path.isdir(label_dir):
+            continue
+        for name in sorted(os.listdir(label_dir)):
+            if name.lower().endswith(VIDEO_EXTS):
+                clips.append((label, os.path.join(label_dir, name)))
+    return clips
+
+def file_hash(path, chunk_size=1 << 20):
+    """ 以檔案內容計算 SHA-256，改名或搬移影片不會觸發重新擷取 """
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+# --- 2. 平行擷取 (每個子行程持有自己的 MediaPipe Pose) ---
+_pose = None
+
+def _init_worker():
+    global _pose
+    import cv2
+    import mediapipe as mp
+    cv2.setNumThreads(1)
+    _pose = mp.solutions.pose.Pose(
+        static_image_mode=False,
+        min_detection_confidence=0.5,
+        min_tracking_confidence=0.5,
+        model_complexity=1
+    )
+
+def _extract_clip(path, cache_path, frame_step):
+    """ 逐幀擷取骨架並轉為 40 維特徵，結果寫入快取 (未偵測到人的影格略過) """
+    import cv2
+    from ai.models import FEATURE_LANDMARKS
+
+    cap = cv2.VideoCapture(path)
+    rows = []
+    idx = 0
+    size = None
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        if size is None:
+            # 以實際解碼後的影格尺寸為準 (直式手機影片可能已依旋轉資訊轉正)
+            size = (frame.shape[1], frame.shape[0])
+        if idx % frame_step == 0:
+            results = _pose.process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+            if results.pose_landmarks:
+                lms = results.pose_landmarks.landmark
+                rows.append([v for i in FEATURE_LANDMARKS for v in (lms[i].x, lms[i].y)])
+        idx += 1
+    cap.release()
+
+    features = np.asarray(rows, dtype=np.float32).reshape(-1, len(FEATURE_LANDMARKS) * 2)
+    # 影格尺寸與特徵一起快取：關鍵點 x 以畫面寬度歸一化，計算角度特徵時需要原始寬高比
+    width, height = size or (0, 0)
+    with open(_size_path(cache_path), "w", encoding="utf-8") as f:
+        json.dump({"width": width, "height": height}, f)
+    tmp_path = cache_path + ".tmp.npy"
+    np.save(tmp_path, features)
+    os.replace(tmp_path, cache_path)
+    return path, features.shape[0], idx
+
+def _size_path(cache_path):
+    return os.path.splitext(cache_path)[0] + ".size.json"
+
+def clip_frame_size(path, cache_path):
+    """ 讀取快取的影格尺寸；舊版快取沒有尺寸檔時解碼一幀補上 """
+    size_path = _size_path(cache_path)
+    if os.path.exists(size_path):
+        with open(size_path, "r", encoding="utf-8") as f:
+            size = json.load(f)
+        return size["width"], size["height"]
+    import cv2
+    cap = cv2.VideoCapture(path)
+    ret, frame = cap.read()
+    cap.release()
+    width, height = (frame.shape[1], frame.shape[0]) if ret else (0, 0)
+    with open(size_path, "w", encoding="utf-8") as f:
+        json.dump({"width": width, "height": height}, f)
+    return width, height
+
+def build_dataset(data_dir, out_dir, cache_dir, workers=None, frame_step=1):
+    """
+    建立欄式資料集：features.npy (N x 40, float32)、labels.npy (N, int32)、clips.npy (N, int32)
+    與描述檔 dataset.json；快取命中的影片不會重新擷取。
+    """
+    from ai.models import FEATURE_NAMES
+
+    os.makedirs(out_dir, exist_ok=True)
+    os.makedirs(cache_dir, exist_ok=True)
+    clips = scan_videos(data_dir)
+    if not clips:
+        raise ValueError(f"在 {data_dir} 找不到任何標記影片")
+
+    label_names = sorted({label for label, _ in clips})
+    label_ids = {name: i for i, name in enumerate(label_names)}
+
+    entries = []
+    pending = []
+    for label, path in clips:
+        digest = file_hash(path)
+        cache_path = os.path.join(cache_dir, f"{digest}_s{frame_step}.npy")
+        entries.append({"path": path, "label": label, "hash": digest, "cache": cache_path})
+        if not os.path.exists(cache_path):
+            pending.append((path, cache_path))
+
+    print(f"[Dataset] 共 {len(entries)} 部影片，快取命中 {len(entries) - len(pending)}，需擷取 {len(pending)}", flush=True)
+    if pending:
+        t0 = time.time()
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            futures = [pool.submit(_extract_clip, path, cache_path, frame_step) for path, cache_path in pending]
+            for n, fut in enumerate(as_completed(futures), 1):
+                path, kept, total = fut.result()
+                print(f"[Dataset] ({n}/{len(pending)}) {os.path.basename(path)}: {kept}/{total} 幀有骨架", flush=True)
+        print(f"[Dataset] 擷取完成，耗時 {time.time() - t0:.1f}s", flush=True)
+
+    feats, labels, clip_ids = [], [], []
+    for ci, entry in enumerate(entries):
+        arr = np.load(entry["cache"])
+        entry["frames"] = int(arr.shape[0])
+        entry["width"], entry["height"] = clip_frame_size(entry["path"], entry["cache"])
+        feats.append(arr)
+        labels.append(np.full(arr.shape[0], label_ids[entry["label"]], dtype=np.int32))
+        clip_ids.append(np.full(arr.shape[0], ci, dtype=np.int32))
+
+    X = np.concatenate(feats) if feats else np.zeros((0, len(FEATURE_NAMES)), dtype=np.float32)
+    y = np.concatenate(labels)
+    clip_arr = np.concatenate(clip_ids)
+    np.save(os.path.join(out_dir, "features.npy"), X)
+    np.save(os.path.join(out_dir, "labels.npy"), y)
+    np.save(os.path.join(out_dir, "clips.npy"), clip_arr)
+    meta = {
+        "feature_names": FEATURE_NAMES,
+        "labels": {str(i): name for i, name in enumerate(label_names)},
+        "frame_step": frame_step,
+        "clips": [{k: e[k] for k in ("path", "label", "hash", "frames", "width", "height")} for e in entries],
+    }
+    with open(os.path.join(out_dir, "dataset.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    print(f"[Dataset] ✅ 資料集: {X.shape[0]} 筆樣本, {len(label_names)} 個類別 -> {out_dir}", flush=True)
+    return X, y, clip_arr, meta
+
+# --- 3. 訓練與評估 ---
+def split_by_clip(y, clip_ids, test_ratio=0.2, seed=42):
+    """
+    以影片為單位切分訓練 / 驗證集，避免同一影片的相鄰影格同時出現在兩邊；
+    某類別只有一部影片時退回以影格隨機切分。
+    """
+    rng = np.random.default_rng(seed)
+    test_mask = np.zeros(len(y), dtype=bool)
+    for cls in np.unique(y):
+        cls_clips = np.unique(clip_ids[y == cls])
+        if len(cls_clips) >= 2:
+            n_test = max(1, int(round(len(cls_clips) * test_ratio)))
+            chosen = rng.choice(cls_clips, n_test, replace=False)
+            test_mask |= np.isin(clip_ids, chosen)
+        else:
+            idx = np.flatnonzero(y == cls)
+            chosen = rng.choice(idx, max(1, int(len(idx) * test_ratio)), replace=False)
+            test_mask[chosen] = True
+    return ~test_mask, test_mask
+
+def measure_latency(booster, X, runs=200):
+    """ 單筆推論延遲 (含 DMatrix 建立，與 PoseEngine._predict_pose 相同路徑) 與批次吞吐量 """
+    import xgboost as xgb
+    samples = X[np.arange(runs) % len(X)]
+    times = []
+    for row in samples:
+        t0 = time.perf_counter()
+        booster.predict(xgb.DMatrix(row[None, :]))
+        times.append((time.perf_counter() - t0) * 1000)
+    t0 = time.perf_counter()
+    booster.predict(xgb.DMatrix(X))
+    batch_s = time.perf_counter() - t0
+    return {
+        "single_p50_ms": float(np.percentile(times, 50)),
+        "single_p95_ms": float(np.percentile(times, 95)),
+        "batch_rows_per_s": float(len(X) / batch_s) if batch_s > 0 else 0.0,
+    }
+
+def add_angle_features(X, meta, clip_ids):
+    """
+    由既有 40 維座標特徵批次計算 8 個關節角度並附加於後 (不需重新擷取影片)；
+    每筆樣本使用其來源影片的實際寬高比，與執行端以攝影機比例計算的角度一致
+    """
+    from ai.biomechanics import angle_features, ANGLE_FEATURE_NAMES, DEFAULT_ASPECT
+    clip_aspects = np.array([c["width"] / c["height"] if c.get("height") else DEFAULT_ASPECT
+                             for c in meta["clips"]], dtype=np.float32)
+    X = np.hstack([X, angle_features(X, clip_aspects[clip_ids]).astype(np.float32)])
+    meta["feature_names"] = list(meta["feature_names"]) + ANGLE_FEATURE_NAMES
+    return X, meta
+
+def train(X, y, clip_ids, label_names, out_dir, model_name="yoga_pose_model_RightFoot.json",
+          labels_name="rightfoot.json", rounds=200, max_depth=6, eta=0.1, feature_names=None):
+    """ 重新訓練 XGBoost 分類器，輸出模型、標籤檔與評估報告 """
+    import xgboost as xgb
+
+    # 三段切分 (皆以影片為單位)：驗證集只用於 early stopping，報告的準確率來自從未參與訓練決策的測試集
+    train_mask, test_mask = split_by_clip(y, clip_ids)
+    fit_idx = np.flatnonzero(train_mask)
+    fit_sub, val_sub = split_by_clip(y[fit_idx], clip_ids[fit_idx], seed=43)
+    fit_mask = np.zeros(len(y), dtype=bool)
+    val_mask = np.zeros(len(y), dtype=bool)
+    fit_mask[fit_idx[fit_sub]] = True
+    val_mask[fit_idx[val_sub]] = True
+    dtrain = xgb.DMatrix(X[fit_mask], label=y[fit_mask])
+    dval = xgb.DMatrix(X[val_mask], label=y[val_mask])
+    dtest = xgb.DMatrix(X[test_mask], label=y[test_mask])
+    params = {
+        "objective": "multi:softprob",
+        "num_class": len(label_names),
+        "max_depth": max_depth,
+        "eta": eta,
+        "eval_metric": "mlogloss",
+        "tree_method": "hist",
+    }
+    t0 = time.time()
+    booster = xgb.train(params, dtrain, num_boost_round=rounds, evals=[(dval, "valid")],
+                        early_stopping_rounds=20, verbose_eval=False)
+    train_s = time.time() - t0
+    # xgb.train 回傳最後一輪的模型，裁切到最佳輪數再評估與儲存
+    best_iteration = int(booster.best_iteration)
+    booster = booster[: best_iteration + 1]
+
+    pred = np.argmax(booster.predict(dtest), axis=1)
+    y_test = y[test_mask]
+    per_class = {}
+    for i, name in enumerate(label_names):
+        mask = y_test == i
+        per_class[name] = float((pred[mask] == i).mean()) if mask.any() else None
+
+    model_path = os.path.join(out_dir, model_name)
+    labels_path = os.path.join(out_dir, labels_name)
+    booster.save_model(model_path)
+    with open(labels_path, "w", encoding="utf-8") as f:
+        json.dump({str(i): name for i, name in enumerate(label_names)}, f, ensure_ascii=False, indent=4)
+
+    report = {
+        "feature_names": feature_names,
+        "train_samples": int(fit_mask.sum()),
+        "valid_samples": int(val_mask.sum()),
+        "test_samples": int(test_mask.sum()),
+        "best_iteration": best_iteration,
+        "train_seconds": round(train_s, 2),
+        "accuracy": float((pred == y_test).mean()) if len(y_test) else None,
+        "per_class_accuracy": per_class,
+        "latency": measure_latency(booster, X[test_mask] if test_mask.any() else X),
+    }
+    with open(os.path.join(out_dir, "report.json"), "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    return model_path, labels_path, report
+
+def main():
+    parser = argparse.ArgumentParser(description="從標記影片重建瑜珈姿勢分類模型")
+    parser.add_argument("data_dir", help="影片根目錄 (子資料夾名稱即標籤)")
+    parser.add_argument("--out", default="build/pose_model", help="資料集與模型輸出目錄")
+    parser.add_argument("--cache", default=os.path.join(".cache", "landmarks"), help="骨架擷取快取目錄")
+    parser.add_argument("--workers", type=int, default=None, help="平行擷取的行程數 (預設為 CPU 核心數)")
+    parser.add_argument("--frame-step", type=int, default=1, help="每 N 幀取樣一次")
+    parser.add_argument("--rounds", type=int, default=200, help="最大 boosting 輪數")
+    parser.add_argument("--angles", action="store_true", help="附加 8 個關節角度特徵 (48 維模型，執行端自動辨識)")
+    args = parser.parse_args()
+
+    X, y, clip_ids, meta = build_dataset(args.data_dir, args.out, args.cache, args.workers, args.frame_step)
+    if args.angles:
+        X, meta = add_angle_features(X, meta, clip_ids)
+    label_names = [meta["labels"][str(i)] for i in range(len(meta["labels"]))]
+    model_path, labels_path, report = train(X, y, clip_ids, label_names, args.out, rounds=args.rounds,
+                                            feature_names=meta["feature_names"])
+
+    print(f"[Train] 🚀 模型: {model_path}", flush=True)
+    print(f"[Train] 標籤: {labels_path}", flush=True)
+    print(f"[Train] 準確率: {report['accuracy']:.3f} ({report['test_samples']} 筆驗證樣本)", flush=True)
+    for name, acc in report["per_class_accuracy"].items():
+        print(f"        {name}: {'N/A' if acc is None else f'{acc:.3f}'}")
+    lat = report["latency"]
+    print(f"[Train] 推論延遲 p50 {lat['single_p50_ms']:.2f} ms / p95 {lat['single_p95_ms']:.2f} ms，"
+          f"批次 {lat['batch_rows_per_s']:.0f} 筆/秒", flush=True)
+
+if __name__ == "__main__":
+    sys.exit(main())
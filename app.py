@@ -1,22 +1,23 @@
 import sys
 import time
 import os
-import cv2
-import json
-import mediapipe as mp
-import numpy as np
-from PyQt6.QtWidgets import QApplication, QMainWindow
-from PyQt6.QtCore import QThread, pyqtSignal, Qt, QTimer
+import multiprocessing
+from PyQt6.QtWidgets import QApplication
+from PyQt6.QtCore import QThread, pyqtSignal, Qt
 from PyQt6.QtGui import QImage
 
 # 匯入專案自定義模組
 try:
     from ui.main import MainUI
-    from ai.models import PoseEngine, VTuberRenderer
     from core.state import SystemState
-    from core.gesture_engine import GestureEngine
+    from core.pipeline import build_pipeline, STATUS_OUTPUTS
+    from core.frame_result import FrameResult, LatestMailbox
+    from core.capture import CameraSource, CaptureConfig, LatencyStats
+    from core.coach_throttle import CoachThrottle
+    from core.history_store import HistoryStore, SessionRecorder
+    from core.inference_worker import InferenceProcess
     # 從更新後的引擎匯入 Gemini 與 Ollama
-    from ai.llm_engine import GeminiCoach, OllamaCoach 
+    from ai.llm_engine import GeminiCoach, OllamaCoach, build_coach_query
 except ImportError as e:
     print(f"[Import Error] 缺少模組: {e}")
 
@@ -26,15 +27,21 @@ def resource_path(relative_path):
         return os.path.join(sys._MEIPASS, relative_path)
     return os.path.join(os.path.abspath("."), relative_path)
 
+def to_qimg(img):
+    """ BGR ndarray 轉為獨立持有記憶體的 QImage """
+    h, w, c = img.shape
+    return QImage(img.data, w, h, c*w, QImage.Format.Format_BGR888).copy()
+
 # --- 1. LLM 非同步處理執行緒 (支援座標分析) ---
 class LLMWorker(QThread):
     finished = pyqtSignal(str)
 
-    def __init__(self, coach, status, landmarks):
+    def __init__(self, coach, status, landmarks, metrics=None):
         super().__init__()
         self.coach = coach
         self.status = status
         self.landmarks = landmarks
+        self.metrics = metrics
 
     def run(self):
         """ 執行 AI 請求 """
@@ -42,117 +49,117 @@ class LLMWorker(QThread):
             self.finished.emit("教練目前不在線上。")
             return
 
-        # 將座標字典轉為文字描述，讓 AI 更好判斷
-        # 例如：L_Knee:(0.50, 0.80), R_Knee:(0.52, 0.82)
-        lm_str = ", ".join([f"{k}:({v[0]:.2f}, {v[1]:.2f})" for k, v in self.landmarks.items()])
-        
-        # 構造精確的 Prompt
-        query = (
-            f"使用者目前姿勢標籤為: {self.status}。 "
-            f"關鍵點座標(歸一化): {lm_str}。 "
-            "請判斷使用者動作哪裡不標準，並給出一句 20 字內的具體修正建議。"
-        )
-
+        query = build_coach_query(self.status, self.landmarks, self.metrics)
         res = self.coach.ask(query)
         self.finished.emit(res)
 
 # --- 2. 影像處理核心執行緒 (負責提取座標與影像) ---
 class VideoThread(QThread):
-    raw_ready = pyqtSignal(QImage)
-    vt_ready = pyqtSignal(QImage)
-    # 擴展訊號: (is_active, fps, feedback, hand_x, hand_y, pose_landmarks)
-    status_update = pyqtSignal(bool, float, str, float, float, dict)
+    """
+    每幀結果打包成 FrameResult 放入最新值信箱，由 GUI 以螢幕刷新率輪詢；
+    只有手勢指令 (不可遺失) 仍以訊號送出。
+    """
     gesture_cmd = pyqtSignal(str)
 
     def __init__(self, state):
         super().__init__()
         self.state = state
-        self.pose = PoseEngine(
+        self.engine, self.stages = build_pipeline(
+            state,
             model_path=resource_path("yoga_pose_model_RightFoot.json"),
-            labels_path=resource_path("rightfoot.json")
-        )
-        self.vt = VTuberRenderer()
-        self.gesture_engine = GestureEngine()
-        
-        self.mp_hands = mp.solutions.hands
-        self.hands = self.mp_hands.Hands(
-            static_image_mode=False,
-            max_num_hands=1,
-            min_detection_confidence=0.7,
-            min_tracking_confidence=0.5
+            labels_path=resource_path("rightfoot.json"),
+            encoder=to_qimg,
+            subscriptions=STATUS_OUTPUTS + ("raw_image", "vt_image")
         )
+        self.model_load_ms = self.stages.pose.load_ms
+        self.mailbox = LatestMailbox()
 
     def run(self):
         print("[VideoThread] 正在開啟攝影機...", flush=True)
-        cap = cv2.VideoCapture(0)
-        if not cap.isOpened():
+        cap = CameraSource(CaptureConfig(device=0))
+        if not cap.open():
             print("[VideoThread] ❌ 錯誤：無法開啟攝影機", flush=True)
             return
+        self.stages.source = cap
 
         last_time = time.time()
+        seq = 0
         while not self.state.stop_signal:
-            ret, frame = cap.read()
-            if not ret: continue
-            
-            frame = cv2.flip(frame, 1)
-            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            
-            anno_frame = frame.copy()
-            skeleton = None
-            feedback = ""
-            is_active = False
-            hand_x, hand_y = -1.0, -1.0
-            pose_landmarks = {}
-
-            if self.state.mode == "EXERCISE":
-                anno_frame, skeleton, feedback = self.pose.process(frame)
-                if skeleton:
-                    # 1. 提取右食指位置供懸浮控制
-                    r_idx = skeleton.landmark[20]
-                    if r_idx.visibility > 0.5:
-                        hand_x, hand_y = r_idx.x, r_idx.y
-                    
-                    # 2. 提取關鍵關節座標供 AI 建議使用
-                    # 11,12:肩 | 23,24:髖 | 25,26:膝 | 27,28:踝
-                    targets = {"L_Shoulder": 11, "R_Shoulder": 12, "L_Knee": 25, "R_Knee": 26, "L_Ankle": 27, "R_Ankle": 28}
-                    for name, idx in targets.items():
-                        lm = skeleton.landmark[idx]
-                        if lm.visibility > 0.5:
-                            pose_landmarks[name] = [lm.x, lm.y]
-            else:
-                results = self.hands.process(rgb_frame)
-                feedback = "手部操控模式"
-                if results.multi_hand_landmarks:
-                    lm = results.multi_hand_landmarks[0]
-                    is_fist = self.gesture_engine.is_fist(lm)
-                    cmd = self.gesture_engine.get_swipe_command(lm, is_fist, self.state.current_page)
-                    hand_x, hand_y = lm.landmark[8].x, lm.landmark[8].y
-                    if cmd:
-                        self.gesture_cmd.emit(cmd)
-
-            def to_qimg(img):
-                h, w, c = img.shape
-                return QImage(img.data, w, h, c*w, QImage.Format.Format_BGR888).copy()
-
-            self.raw_ready.emit(to_qimg(anno_frame))
-            self.vt_ready.emit(to_qimg(self.vt.render(skeleton)))
-            
+            ctx = self.engine.run_once()
+            if ctx is None: continue
+
+            if ctx["gesture_cmd"]:
+                self.gesture_cmd.emit(ctx["gesture_cmd"])
+
             curr_time = time.time()
             fps = 1.0 / (curr_time - last_time) if (curr_time - last_time) > 0 else 0
             last_time = curr_time
-            
-            self.status_update.emit(is_active, fps, feedback, hand_x, hand_y, pose_landmarks)
+
+            self.mailbox.publish(FrameResult.from_ctx(seq, ctx, fps, dict(self.engine.timings)))
+            seq += 1
             
         cap.release()
-        self.hands.close()
+        self.engine.close()
+
+# --- 2b. 獨立行程推論 (GUI 行程只負責合成畫面) ---
+class ProcessVideoThread(QThread):
+    """
+    與 VideoThread 介面相容 (mailbox + gesture_cmd)：擷取與推論在子行程執行，
+    此執行緒只從共享記憶體讀取影格並放入信箱，避免推論佔用 GUI 行程的 GIL。
+    """
+    gesture_cmd = pyqtSignal(str)
+
+    def __init__(self, state):
+        super().__init__()
+        self.state = state
+        self.worker = InferenceProcess(
+            model_path=resource_path("yoga_pose_model_RightFoot.json"),
+            labels_path=resource_path("rightfoot.json")
+        )
+        self.mailbox = LatestMailbox()
+
+    def run(self):
+        self.worker.start()
+        while not self.state.stop_signal:
+            self.worker.sync_state(self.state)
+            self.worker.ensure_alive()
+            # 一次取走已到達的訊息，只轉換最新一幀：被取代的影格不在 GUI 行程中讀取或複製
+            for msg in self.worker.drain(timeout=0.1):
+                kind = msg[0]
+                if kind == "cmd":
+                    self.gesture_cmd.emit(msg[1])
+                elif kind == "frame":
+                    self._publish_frame(msg)
+                elif kind == "error":
+                    print(f"[ProcessVideoThread] ❌ 推論行程錯誤: {msg[1]}", flush=True)
+
+        self.worker.stop()
+
+    def _publish_frame(self, msg):
+        seq, mode, has_vt, is_active, fps, feedback, hand_x, hand_y, pose_landmarks, metrics = msg[1:]
+        raw = self.worker.raw_ring.read(seq, to_qimg)
+        vt = self.worker.vt_ring.read(seq, to_qimg) if has_vt else None
+        # 影格在讀取前已被覆寫 (GUI 落後)，直接略過
+        if raw is None or (has_vt and vt is None):
+            return
+        self.mailbox.publish(FrameResult(seq, mode, 0.0, fps, is_active, feedback, hand_x, hand_y,
+                                         pose_landmarks, metrics, raw, vt))
 
 # --- 3. 主程序入口 ---
 def main():
     print("[System] 正在啟動程序...", flush=True)
+    startup_t0 = time.perf_counter()
     app = QApplication(sys.argv)
     
     state = SystemState()
-    ui = MainUI(state)
+    history = HistoryStore()
+    recorder = SessionRecorder(history)
+    app.aboutToQuit.connect(recorder.close)
+    # --no-ui-diff: 每幀重設全部提示列元件 (對照 GUI 執行緒耗時用)
+    # --ui-timing: 輸出 update_status 耗時統計；對照模式下自動開啟
+    ui_diff = "--no-ui-diff" not in sys.argv
+    ui = MainUI(state, diff_updates=ui_diff, history=history,
+                ui_timing=not ui_diff or "--ui-timing" in sys.argv)
 
     # 💡 優先初始化 GeminiCoach (雲端版，免安裝 Ollama)
     coach = None
@@ -167,39 +174,35 @@ def main():
         except:
             coach = None
 
-    video = VideoThread(state)
-    video.raw_ready.connect(ui.update_video)
-    video.vt_ready.connect(ui.update_vtuber)
+    # --process: 擷取與推論移至獨立行程
+    video = ProcessVideoThread(state) if "--process" in sys.argv else VideoThread(state)
     video.gesture_cmd.connect(ui.handle_command)
 
     # --- 4. 智慧教練觸發邏輯 ---
-    last_coach_time = 0
-    last_status = ""
-
-    def handle_coach_trigger(is_active, fps, feedback, x, y, pose_data):
-        nonlocal last_coach_time, last_status
-        # 更新介面狀態 (原本 ui.update_status 接收 5 個參數)
-        ui.update_status(is_active, fps, feedback, x, y)
+    throttle = CoachThrottle(cooldown=15)
+    latency = LatencyStats("擷取 -> 繪製")
+
+    def handle_frame(result):
+        """ GUI 每次重繪取得的最新結果 (畫面與提示列已由 MainUI 更新) """
+        if result.capture_ts:
+            latency.add(result.capture_ts)
+        recorder.on_frame(result.mode, result.feedback)
         
-        if state.mode != "EXERCISE" or coach is None: return
+        if result.mode != "EXERCISE" or coach is None: return
         
-        current_time = time.time()
         # 觸發條件：15秒冷卻且狀態文字有變且有座標數據
-        if current_time - last_coach_time > 15 and pose_data:
-            if feedback != last_status and ("正確" in feedback or "偏移" in feedback):
-                execute_llm_request(feedback, pose_data)
+        if throttle.should_trigger(result.feedback, result.pose_landmarks):
+            execute_llm_request(result.feedback, result.pose_landmarks, result.metrics)
 
-    def execute_llm_request(status_text, landmarks):
+    def execute_llm_request(status_text, landmarks, metrics=None):
         """ 啟動 LLM Worker """
-        nonlocal last_coach_time, last_status
         print(f"[Coach] 正在獲取建議: {status_text}", flush=True)
+        throttle.mark(status_text)
         
-        last_coach_time = time.time()
-        last_status = status_text
-        
-        worker = LLMWorker(coach, status_text, landmarks)
+        worker = LLMWorker(coach, status_text, landmarks, metrics)
         if hasattr(ui, 'show_coach'):
             worker.finished.connect(ui.show_coach)
+        worker.finished.connect(lambda text: recorder.on_advice(status_text, text))
         
         ui._current_llm_worker = worker 
         worker.start()
@@ -216,11 +219,23 @@ def main():
             original_key_press(event)
 
     ui.keyPressEvent = manual_test_trigger
-    video.status_update.connect(handle_coach_trigger)
+    # 以螢幕刷新率輪詢最新結果，GUI 落後時舊結果直接被覆寫而不排隊
+    ui.attach_mailbox(video.mailbox, on_frame=handle_frame)
+
+    def shutdown():
+        """ 事件迴圈結束前先停止影像執行緒並等它收尾 (推論行程關閉、共享記憶體 unlink)，再讓直譯器結束 """
+        state.stop_signal = True
+        video.wait()
+    app.aboutToQuit.connect(shutdown)
 
     video.start()
     ui.show()
+    # 模型載入另外列出 (--process 模式在子行程載入，由子行程自行回報)
+    model_ms = getattr(video, "model_load_ms", None)
+    startup_ms = (time.perf_counter() - startup_t0) * 1000
+    print(f"[System] ✅ 啟動完成 {startup_ms:.0f} ms" + (f" (模型載入 {model_ms:.1f} ms)" if model_ms is not None else ""), flush=True)
     sys.exit(app.exec())
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # PyInstaller 打包後的子行程需要
     main()
\ No newline at end of file
@@ -0,0 +1,218 @@
+import sys
+import time
+import argparse
+import cv2
+
+class CaptureConfig:
+    """
+    攝影機擷取設定
+    - fourcc: 影像編碼 (MJPG 可在 USB 頻寬內達到較高解析度 / 幀率；YUYV 為多數驅動預設)
+    - buffer_size: 驅動內部緩衝幀數，1 表示只保留最新影格以降低延遲
+    - hardware_timestamps: 優先使用驅動提供的影格時間戳 (V4L2 與 time.monotonic 同基準)
+    """
+    def __init__(self, device=0, fourcc="MJPG", width=640, height=480, fps=30, buffer_size=1,
+                 backend=cv2.CAP_ANY, hardware_timestamps=True):
+        self.device = device
+        self.fourcc = fourcc
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.buffer_size = buffer_size
+        self.backend = backend
+        self.hardware_timestamps = hardware_timestamps
+
+def _decode_fourcc(value):
+    code = int(value)
+    return "".join(chr((code >> 8 * i) & 0xFF) for i in range(4)).strip("\x00")
+
+def negotiate(cap, config):
+    """
+    依序設定 FOURCC -> 解析度 -> 幀率 -> 緩衝區 (部分 V4L2 驅動需先設定 FOURCC 才接受高解析度)，
+    並讀回驅動實際採用的值
+    """
+    if config.fourcc:
+        cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*config.fourcc))
+    if config.width and config.height:
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, config.width)
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, config.height)
+    if config.fps:
+        cap.set(cv2.CAP_PROP_FPS, config.fps)
+    if config.buffer_size:
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, config.buffer_size)
+    return {
+        "fourcc": _decode_fourcc(cap.get(cv2.CAP_PROP_FOURCC)),
+        "width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+        "height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+        "fps": cap.get(cv2.CAP_PROP_FPS),
+        "buffer_size": int(cap.get(cv2.CAP_PROP_BUFFERSIZE)),
+        "backend": cap.getBackendName() if hasattr(cap, "getBackendName") else "",
+    }
+
+class CameraSource:
+    """
+    帶時間戳與自動重連的攝影機來源 (read() 介面與 cv2.VideoCapture 相容，可直接作為 pipeline 的 source)
+    每張影格的擷取時間 (time.monotonic 秒) 存於 last_timestamp，供端到端延遲量測。
+    連續讀取失敗時釋放裝置並以指數退避重新開啟，read() 不會阻塞超過一小段時間。
+    """
+    MAX_FAILURES = 10
+    MIN_BACKOFF = 0.5
+    MAX_BACKOFF = 5.0
+
+    def __init__(self, config=None):
+        self.config = config or CaptureConfig()
+        self.cap = None
+        self.negotiated = {}
+        self.last_timestamp = None
+        self.reconnects = 0
+        self._failures = 0
+        self._backoff = self.MIN_BACKOFF
+        self._retry_at = 0.0
+
+    def open(self):
+        cap = cv2.VideoCapture(self.config.device, self.config.backend)
+        if not cap.isOpened():
+            cap.release()
+            return False
+        self.cap = cap
+        self.negotiated = negotiate(cap, self.config)
+        n = self.negotiated
+        print(f"[Capture] 📷 裝置 {self.config.device}: {n['fourcc']} {n['width']}x{n['height']} @ {n['fps']:.1f} fps, "
+              f"緩衝 {n['buffer_size']} ({n['backend']})", flush=True)
+        return True
+
+    def isOpened(self):
+        return self.cap is not None and self.cap.isOpened()
+
+    def _timestamp(self):
+        """ 驅動時間戳與本機單調時鐘相差 1 秒內才採用，否則以 grab 完成的時間為準 """
+        host = time.monotonic()
+        if self.config.hardware_timestamps:
+            hw = self.cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+            if 0 < host - hw < 1.0:
+                return hw
+        return host
+
+    def read(self):
+        if self.cap is None:
+            if time.monotonic() < self._retry_at:
+                time.sleep(0.05)
+                return False, None
+            if not self.open():
+                self._schedule_retry()
+                return False, None
+            self.reconnects += 1
+            self._backoff = self.MIN_BACKOFF
+
+        # grab 與 retrieve 分開：時間戳盡量貼近影格實際抵達的時刻
+        if self.cap.grab():
+            self.last_timestamp = self._timestamp()
+            ret, frame = self.cap.retrieve()
+            if ret:
+                self._failures = 0
+                return True, frame
+
+        self._failures += 1
+        if self._failures >= self.MAX_FAILURES:
+            print(f"[Capture] ⚠️ 裝置 {self.config.device} 連續 {self._failures} 次讀取失敗，{self._backoff:.1f}s 後重新連線", flush=True)
+            self.cap.release()
+            self.cap = None
+            self._failures = 0
+            self._schedule_retry()
+        else:
+            time.sleep(0.005)
+        return False, None
+
+    def _schedule_retry(self):
+        self._retry_at = time.monotonic() + self._backoff
+        self._backoff = min(self._backoff * 2, self.MAX_BACKOFF)
+
+    def release(self):
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+class LatencyStats:
+    """ 擷取到輸出的延遲統計，每隔 interval 秒輸出一次 """
+    def __init__(self, name, interval=10.0):
+        self.name = name
+        self.interval = interval
+        self.samples = []
+        self._window_start = time.monotonic()
+
+    def add(self, capture_ts):
+        now = time.monotonic()
+        self.samples.append((now - capture_ts) * 1000)
+        if now - self._window_start >= self.interval:
+            ordered = sorted(self.samples)
+            print(f"[Latency] {self.name}: 平均 {sum(ordered) / len(ordered):.1f} ms | "
+                  f"p95 {ordered[int(len(ordered) * 0.95)]:.1f} ms | {len(ordered)} 幀", flush=True)
+            self.samples = []
+            self._window_start = now
+
+# --- 支援模式探測 ---
+PROBE_FOURCCS = ("MJPG", "YUYV")
+PROBE_SIZES = ((320, 240), (640, 480), (1280, 720), (1920, 1080))
+PROBE_FPS = (30, 60)
+
+def measure_rate(cap, frames=60, warmup=10):
+    """ 實際量測驅動的影格送達速率 (fps) """
+    for _ in range(warmup):
+        cap.read()
+    t0 = time.monotonic()
+    got = 0
+    for _ in range(frames):
+        ret, _ = cap.read()
+        if ret:
+            got += 1
+    elapsed = time.monotonic() - t0
+    return got / elapsed if elapsed > 0 else 0.0
+
+def probe_modes(device=0, frames=60, backend=cv2.CAP_ANY):
+    """ 逐一嘗試 FOURCC / 解析度 / 幀率組合，回傳驅動實際接受的模式與量測到的送達速率 """
+    results = []
+    seen = set()
+    for fourcc in PROBE_FOURCCS:
+        for width, height in PROBE_SIZES:
+            for fps in PROBE_FPS:
+                config = CaptureConfig(device, fourcc, width, height, fps, backend=backend)
+                cap = cv2.VideoCapture(device, backend)
+                if not cap.isOpened():
+                    return results
+                n = negotiate(cap, config)
+                key = (n["fourcc"], n["width"], n["height"], round(n["fps"]))
+                if key not in seen:
+                    seen.add(key)
+                    n["requested"] = f"{fourcc} {width}x{height}@{fps}"
+                    n["measured_fps"] = measure_rate(cap, frames)
+                    results.append(n)
+                    print(f"[Probe] {n['requested']:<20} -> {n['fourcc']} {n['width']}x{n['height']} "
+                          f"@ {n['fps']:.1f} (實測 {n['measured_fps']:.1f} fps)", flush=True)
+                cap.release()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="攝影機擷取模式探測")
+    parser.add_argument("--probe", action="store_true", help="列出支援的模式與實測送達速率")
+    parser.add_argument("--device", type=int, default=0, help="攝影機索引")
+    parser.add_argument("--frames", type=int, default=60, help="每個模式量測的影格數")
+    args = parser.parse_args()
+
+    if args.probe:
+        modes = probe_modes(args.device, args.frames)
+        if not modes:
+            print(f"[Probe] ❌ 無法開啟攝影機 {args.device}", flush=True)
+            return 1
+        best = max(modes, key=lambda m: (m["measured_fps"], m["width"] * m["height"]))
+        print(f"[Probe] ✅ 最高實測幀率: {best['fourcc']} {best['width']}x{best['height']} @ {best['measured_fps']:.1f} fps")
+        return 0
+
+    source = CameraSource(CaptureConfig(args.device))
+    if not source.open():
+        print(f"[Capture] ❌ 無法開啟攝影機 {args.device}", flush=True)
+        return 1
+    print(f"[Capture] 實測送達速率: {measure_rate(source.cap, args.frames):.1f} fps")
+    source.release()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
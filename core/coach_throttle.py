@@ -0,0 +1,22 @@
+import time
+
+class CoachThrottle:
+    """
+    AI 教練觸發節流：冷卻時間內不重複請求，且僅在姿勢狀態文字改變時觸發
+    """
+    def __init__(self, cooldown=15.0):
+        self.cooldown = cooldown
+        self.last_time = 0.0
+        self.last_status = ""
+
+    def should_trigger(self, feedback, pose_data, now=None):
+        """ 觸發條件：冷卻結束、有座標數據、狀態文字有變且為可評論的標籤 """
+        now = time.time() if now is None else now
+        if now - self.last_time <= self.cooldown or not pose_data:
+            return False
+        return feedback != self.last_status and ("正確" in feedback or "偏移" in feedback)
+
+    def mark(self, status, now=None):
+        """ 記錄一次已送出的請求 """
+        self.last_time = time.time() if now is None else now
+        self.last_status = status
@@ -0,0 +1,56 @@
+import threading
+
+class FrameResult:
+    """
+    單幀處理結果：影像、關鍵點、辨識標籤與各階段耗時集中於一筆紀錄
+    使用 __slots__ 固定欄位，每幀不額外配置 __dict__
+    """
+    __slots__ = ("seq", "mode", "capture_ts", "fps", "is_active", "feedback", "hand_x", "hand_y",
+                 "pose_landmarks", "metrics", "raw_image", "vt_image", "timings")
+
+    def __init__(self, seq, mode, capture_ts=0.0, fps=0.0, is_active=False, feedback="", hand_x=-1.0, hand_y=-1.0,
+                 pose_landmarks=None, metrics=None, raw_image=None, vt_image=None, timings=None):
+        self.seq = seq
+        self.mode = mode
+        self.capture_ts = capture_ts
+        self.fps = fps
+        self.is_active = is_active
+        self.feedback = feedback
+        self.hand_x = hand_x
+        self.hand_y = hand_y
+        self.pose_landmarks = pose_landmarks if pose_landmarks is not None else {}
+        self.metrics = metrics
+        self.raw_image = raw_image      # 顯示用影像 (QImage)；None 表示本幀沒有
+        self.vt_image = vt_image
+        self.timings = timings          # 各階段耗時 (ms)
+
+    @classmethod
+    def from_ctx(cls, seq, ctx, fps, timings=None):
+        """ 由 PipelineEngine.run_once 的 context 建立 """
+        return cls(seq, ctx["mode"], ctx.get("capture_ts", 0.0), fps, ctx["is_active"], ctx["feedback"],
+                   ctx["hand_x"], ctx["hand_y"], ctx["pose_landmarks"], ctx["metrics"],
+                   ctx.get("raw_image"), ctx.get("vt_image"), timings)
+
+class LatestMailbox:
+    """
+    單槽最新值信箱：生產端每幀覆寫，消費端 (GUI) 每次重繪前取走一次。
+    GUI 落後時尚未取走的舊結果直接被取代而不排隊，跨執行緒的事件量上限即為螢幕刷新率。
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._item = None
+        self.published = 0
+        self.dropped = 0     # 未被取走就被覆寫的結果數
+
+    def publish(self, item):
+        with self._lock:
+            if self._item is not None:
+                self.dropped += 1
+            self._item = item
+            self.published += 1
+
+    def take(self):
+        """ 取走最新結果；自上次取走後沒有新結果時回傳 None """
+        with self._lock:
+            item, self._item = self._item, None
+        return item
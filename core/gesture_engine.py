@@ -1,32 +1,96 @@
+import numpy as np
+
+# 手部關鍵點：4 根手指尖與對應的第二指節 (PIP)
+FIST_TIPS = [8, 12, 16, 20]
+FIST_PIPS = [6, 10, 14, 18]
+
+# 多手時由哪一隻手取得操控權
+OWNER_POLICIES = ("first", "largest", "center")
+
+def hand_landmarks_to_array(hand_landmarks_list):
+    """ MediaPipe multi_hand_landmarks -> (H, 21, 3) 陣列 """
+    return np.array([[(p.x, p.y, p.z) for p in hand.landmark] for hand in hand_landmarks_list], dtype=np.float32)
+
+def fist_mask(points):
+    """
+    向量化握拳判定：(H, 21, k) -> (H,) bool
+    4 根手指尖中至少 3 根低於第二指節 (Y 軸向下為正)
+    """
+    points = np.asarray(points, dtype=np.float32)
+    return (points[:, FIST_TIPS, 1] > points[:, FIST_PIPS, 1]).sum(axis=1) >= 3
+
+class HandSwipeState:
+    """ 單隻手的滑動狀態機：參考起點、冷卻計時與上一幀握拳狀態 """
+    def __init__(self):
+        self.ref_x = 0.0                     # 參考起點 X
+        self.ref_y = 0.0                     # 參考起點 Y
+        self.gesture_cooldown = 0            # 冷卻計時器
+        self.was_activated = False           # 記錄前一幀是否處於握拳狀態
+
+    def reset_gesture_state(self):
+        """重置參考起點與狀態"""
+        self.ref_x = 0.0
+        self.ref_y = 0.0
+
+class HandTrack:
+    """ 跨幀追蹤的一隻手：穩定編號、手腕位置、手掌大小與遺失幀數 """
+    def __init__(self, hand_id, wrist, size, frame):
+        self.hand_id = hand_id
+        self.wrist = wrist
+        self.size = size
+        self.first_seen = frame
+        self.missed = 0
+        self.swipe = HandSwipeState()
+
 class GestureEngine:
     """
     純邏輯模組：優化累積位移演算法，支援偵錯輸出，並修正頁面字串匹配問題。
+    多手模式 (update) 以手腕最近鄰配對維持穩定手部編號，每隻手有各自的滑動狀態機，
+    握拳與位移一次以陣列計算，只有取得操控權的手能送出指令。
     """
-    def __init__(self):
+    def __init__(self, owner_policy="first", debug=True):
         # --- 1. 系統參數優化 ---
         self.SWIPE_THRESHOLD = 0.07          # 極靈敏門檻 (相對於螢幕寬高的位移比例)
         self.GESTURE_COOLDOWN_FRAMES = 15    # 觸發後的冷卻幀數
         self.GESTURE_PURITY = 1.1            # 進入板塊時的方向純粹度要求
-        
+        self.MATCH_DISTANCE = 0.15           # 手腕跨幀配對的最大距離
+        self.LOST_FRAMES = 10                # 連續遺失幾幀後移除該手
+
         # --- 2. 狀態變數 ---
-        self.ref_x = 0.0                     # 參考起點 X
-        self.ref_y = 0.0                     # 參考起點 Y
-        self.gesture_cooldown = 0            # 冷卻計時器
-        self.was_activated = False           # 記錄前一幀是否處於握拳狀態
+        if owner_policy not in OWNER_POLICIES:
+            raise ValueError(f"owner_policy 必須為 {OWNER_POLICIES} 之一")
+        self.owner_policy = owner_policy
+        self.debug = debug
+        self.single = HandSwipeState()       # 單手相容介面 (get_swipe_command) 使用的狀態
+        self.tracks = {}                     # hand_id -> HandTrack
+        self.owner_id = None
+        self._next_id = 0
+        self._frame = 0
+
+    # --- 單手相容介面 ---
+    @property
+    def ref_x(self):
+        return self.single.ref_x
+
+    @property
+    def ref_y(self):
+        return self.single.ref_y
+
+    @property
+    def gesture_cooldown(self):
+        return self.single.gesture_cooldown
+
+    @property
+    def was_activated(self):
+        return self.single.was_activated
 
     def is_fist(self, lm):
         """
         握拳判定：檢查 4 根手指尖是否低於第二指節 (Y 軸向下為正)
         """
-        tips = [8, 12, 16, 20]
-        pips = [6, 10, 14, 18]
-        count = 0
-        for i in range(4):
-            if lm.landmark[tips[i]].y > lm.landmark[pips[i]].y:
-                count += 1
-        
-        fist_detected = count >= 3
-        return fist_detected
+        tips = np.array([lm.landmark[i].y for i in FIST_TIPS])
+        pips = np.array([lm.landmark[i].y for i in FIST_PIPS])
+        return bool((tips > pips).sum() >= 3)
 
     def get_swipe_command(self, lm, is_activated, current_page):
         """
@@ -37,50 +101,143 @@ class GestureEngine:
         - LEFT: 訓練日曆 (從左往右)
         - CLOSE: 返回主頁
         """
+        wrist = lm.landmark[0]
+        return self._step(self.single, wrist.x, wrist.y, is_activated, current_page)
+
+    def reset_gesture_state(self):
+        """重置參考起點與狀態"""
+        self.single.reset_gesture_state()
+
+    # --- 多手介面 ---
+    def update(self, points, current_page):
+        """
+        多手更新：points 為 (H, 21, k) 手部關鍵點 (k >= 2)
+        回傳: (指令或 None, 操控手在 points 中的索引或 None)
+        """
+        self._frame += 1
+        points = np.asarray(points, dtype=np.float32)
+        if points.size == 0:
+            points = points.reshape(0, 21, 3)
+        wrists = points[:, 0, :2]
+        sizes = np.ptp(points[:, :, 0], axis=1) * np.ptp(points[:, :, 1], axis=1)
+        ids = self._match(wrists, sizes)
+        self._pick_owner(ids, wrists)
+
+        # 所有手的握拳判定與相對參考點的累積位移一次計算
+        fists = fist_mask(points)
+        swipes = [self.tracks[hand_id].swipe for hand_id in ids]
+        refs = np.array([(h.ref_x, h.ref_y) for h in swipes], dtype=np.float32).reshape(-1, 2)
+        deltas = wrists - refs
+
+        command = None
+        owner = ids.index(self.owner_id) if self.owner_id in ids else None
+        for i, hand in enumerate(swipes):
+            cmd = self._step(hand, float(wrists[i, 0]), float(wrists[i, 1]), bool(fists[i]), current_page,
+                             label=f"手 {ids[i]}" if len(ids) > 1 else None, delta=deltas[i])
+            if i == owner:
+                command = cmd
+        return command, owner
+
+    def _match(self, wrists, sizes):
+        """ 手腕最近鄰貪婪配對：距離小於 MATCH_DISTANCE 的沿用舊編號，其餘配發新編號 """
+        track_ids = list(self.tracks)
+        ids = [None] * len(wrists)
+        if track_ids and len(wrists):
+            prev = np.array([self.tracks[t].wrist for t in track_ids], dtype=np.float32)
+            dist = np.linalg.norm(prev[:, None, :] - wrists[None, :, :], axis=2)
+            for flat in np.argsort(dist, axis=None):
+                ti, hi = divmod(int(flat), len(wrists))
+                if dist[ti, hi] > self.MATCH_DISTANCE:
+                    break
+                if ids[hi] is None and track_ids[ti] not in ids:
+                    ids[hi] = track_ids[ti]
+
+        for hi, hand_id in enumerate(ids):
+            if hand_id is None:
+                hand_id = ids[hi] = self._next_id
+                self._next_id += 1
+                self.tracks[hand_id] = HandTrack(hand_id, wrists[hi], sizes[hi], self._frame)
+            track = self.tracks[hand_id]
+            track.wrist = wrists[hi]
+            track.size = sizes[hi]
+            track.missed = 0
+
+        for hand_id in track_ids:
+            if hand_id not in ids:
+                track = self.tracks[hand_id]
+                track.missed += 1
+                if track.missed > self.LOST_FRAMES:
+                    del self.tracks[hand_id]
+        return ids
+
+    def _pick_owner(self, ids, wrists):
+        """ 操控權具黏著性：目前的操控手仍在畫面中就不轉移，遺失後依策略重新選擇 """
+        # 包含短暫遺失 (LOST_FRAMES 內) 的情況，避免旁邊的手趁機接手
+        if self.owner_id in self.tracks:
+            return
+        if not ids:
+            self.owner_id = None
+            return
+        if self.owner_policy == "largest":
+            best = max(range(len(ids)), key=lambda i: self.tracks[ids[i]].size)
+        elif self.owner_policy == "center":
+            best = int(np.argmin(np.abs(wrists[:, 0] - 0.5)))
+        else:
+            best = min(range(len(ids)), key=lambda i: self.tracks[ids[i]].first_seen)
+        self.owner_id = ids[best]
+        if self.debug:
+            print(f"\n[DEBUG] 操控權交給手 {self.owner_id} (策略: {self.owner_policy})")
+
+    def _log(self, text, end="\n"):
+        if self.debug:
+            print(text, end=end)
+
+    def _step(self, hand, curr_x, curr_y, is_activated, current_page, label=None, delta=None):
+        """ 單隻手的滑動狀態機 (單手與多手介面共用)；delta 為多手模式預先以陣列算好的 (dX, dY) """
         # 處理冷卻
-        if self.gesture_cooldown > 0:
-            self.gesture_cooldown -= 1
-            self.was_activated = is_activated
+        if hand.gesture_cooldown > 0:
+            hand.gesture_cooldown -= 1
+            hand.was_activated = is_activated
             return None
 
-        # 取得當前位置 (手腕)
-        wrist = lm.landmark[0]
-        curr_x, curr_y = wrist.x, wrist.y
         command = None
+        prefix = f"[{label}] " if label else ""
 
         # --- 偵錯區：顯示基本狀態 ---
         status_str = "✊ 握拳" if is_activated else "🖐 放開"
-        print(f"\r[狀態] {status_str} | 頁面: {current_page:<12} | 坐標: ({curr_x:.3f}, {curr_y:.3f})", end="")
+        self._log(f"\r{prefix}[狀態] {status_str} | 頁面: {current_page:<12} | 坐標: ({curr_x:.3f}, {curr_y:.3f})", end="")
 
         if is_activated:
             # 剛握拳或失去參考點：初始化參考起點
-            if not self.was_activated or self.ref_x == 0.0:
-                self.ref_x = curr_x
-                self.ref_y = curr_y
-                self.was_activated = True
-                print(f"\n[DEBUG] 設定參考點: ({self.ref_x:.3f}, {self.ref_y:.3f})")
+            if not hand.was_activated or hand.ref_x == 0.0:
+                hand.ref_x = curr_x
+                hand.ref_y = curr_y
+                hand.was_activated = True
+                self._log(f"\n{prefix}[DEBUG] 設定參考點: ({hand.ref_x:.3f}, {hand.ref_y:.3f})")
                 return None
-            
+
             # 計算相對於起點的總累積位移
-            dx = curr_x - self.ref_x
-            dy = curr_y - self.ref_y
+            if delta is None:
+                dx, dy = curr_x - hand.ref_x, curr_y - hand.ref_y
+            else:
+                dx, dy = float(delta[0]), float(delta[1])
             abs_dx = abs(dx)
             abs_dy = abs(dy)
 
             # --- 偵錯區：顯示位移量 ---
-            print(f" | 累積位移 dX: {dx:+.3f}, dY: {dy:+.3f} (門檻: {self.SWIPE_THRESHOLD})", end="")
+            self._log(f" | 累積位移 dX: {dx:+.3f}, dY: {dy:+.3f} (門檻: {self.SWIPE_THRESHOLD})", end="")
 
             # --- 反向重置機制 (修正為與 UI 傳入字串一致) ---
             reset_dist = 0.02
-            if current_page == "DataPage" and dy > reset_dist: 
-                self.ref_y = curr_y
-                print(f"\n[DEBUG] 反向修正: 重置 Y 軸起點至最低點")
-            elif current_page == "SettingsPage" and dy < -reset_dist: 
-                self.ref_y = curr_y
-                print(f"\n[DEBUG] 反向修正: 重置 Y 軸起點至最高點")
-            elif current_page == "CalendarPage" and dx > reset_dist: 
-                self.ref_x = curr_x
-                print(f"\n[DEBUG] 反向修正: 重置 X 軸起點至最右點")
+            if current_page == "DataPage" and dy > reset_dist:
+                hand.ref_y = curr_y
+                self._log(f"\n{prefix}[DEBUG] 反向修正: 重置 Y 軸起點至最低點")
+            elif current_page == "SettingsPage" and dy < -reset_dist:
+                hand.ref_y = curr_y
+                self._log(f"\n{prefix}[DEBUG] 反向修正: 重置 Y 軸起點至最高點")
+            elif current_page == "CalendarPage" and dx > reset_dist:
+                hand.ref_x = curr_x
+                self._log(f"\n{prefix}[DEBUG] 反向修正: 重置 X 軸起點至最右點")
 
             # --- 判斷邏輯 A：主頁 (負責「拉入」板塊) ---
             # 這裡的指令字串已修正為與 UI 的 boards 鍵值一致 (TOP, BOTTOM, LEFT)
@@ -93,7 +250,7 @@ class GestureEngine:
                 elif abs_dx > abs_dy * self.GESTURE_PURITY:
                     if dx > self.SWIPE_THRESHOLD:
                         command = "CalendarPage"     # 訓練日曆 (向右揮，由左拉出)
-            
+
             # --- 判斷邏輯 B：子頁面 (負責「推回」主頁) ---
             else:
                 if current_page == "DataPage" and dy < -self.SWIPE_THRESHOLD:
@@ -104,21 +261,16 @@ class GestureEngine:
                     command = "CLOSE"      # 向左推回
         else:
             # 手掌張開時，清空參考點
-            if self.was_activated:
-                print(f"\n[DEBUG] 手掌張開，清除參考點")
-            self.reset_gesture_state()
-            self.was_activated = False
+            if hand.was_activated:
+                self._log(f"\n{prefix}[DEBUG] 手掌張開，清除參考點")
+            hand.reset_gesture_state()
+            hand.was_activated = False
 
         # 指令觸發後的清理與冷卻
         if command:
-            print(f"\n[!!!] 觸發指令: {command} (冷卻開始)")
-            self.gesture_cooldown = self.GESTURE_COOLDOWN_FRAMES
-            self.reset_gesture_state()
+            self._log(f"\n{prefix}[!!!] 觸發指令: {command} (冷卻開始)")
+            hand.gesture_cooldown = self.GESTURE_COOLDOWN_FRAMES
+            hand.reset_gesture_state()
             return command
 
         return None
-
-    def reset_gesture_state(self):
-        """重置參考起點與狀態"""
-        self.ref_x = 0.0
-        self.ref_y = 0.0
\ No newline at end of file
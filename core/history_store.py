@@ -0,0 +1,389 @@
+import os
+import sys
+import time
+import queue
+import sqlite3
+import argparse
+import tempfile
+import threading
+from core.state import user_data_path
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    started_at REAL NOT NULL,
+    ended_at REAL
+);
+CREATE TABLE IF NOT EXISTS label_events (
+    id INTEGER PRIMARY KEY,
+    session_id INTEGER NOT NULL,
+    ts REAL NOT NULL,
+    label TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS pose_holds (
+    id INTEGER PRIMARY KEY,
+    session_id INTEGER NOT NULL,
+    label TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    duration REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS coach_advice (
+    id INTEGER PRIMARY KEY,
+    session_id INTEGER NOT NULL,
+    ts REAL NOT NULL,
+    status TEXT NOT NULL,
+    advice TEXT NOT NULL
+);
+-- 每日彙總：日曆與趨勢查詢只讀這兩張小表，不需掃描明細
+CREATE TABLE IF NOT EXISTS daily_stats (
+    day TEXT PRIMARY KEY,
+    sessions INTEGER NOT NULL DEFAULT 0,
+    session_seconds REAL NOT NULL DEFAULT 0,
+    holds INTEGER NOT NULL DEFAULT 0,
+    hold_seconds REAL NOT NULL DEFAULT 0,
+    label_changes INTEGER NOT NULL DEFAULT 0,
+    advice INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS daily_label_stats (
+    day TEXT NOT NULL,
+    label TEXT NOT NULL,
+    holds INTEGER NOT NULL DEFAULT 0,
+    hold_seconds REAL NOT NULL DEFAULT 0,
+    best_hold REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, label)
+);
+CREATE INDEX IF NOT EXISTS idx_label_events_session_ts ON label_events (session_id, ts);
+CREATE INDEX IF NOT EXISTS idx_pose_holds_label_start ON pose_holds (label, started_at);
+CREATE INDEX IF NOT EXISTS idx_pose_holds_start ON pose_holds (started_at);
+CREATE INDEX IF NOT EXISTS idx_coach_advice_ts ON coach_advice (ts);
+"""
+
+def day_of(ts):
+    """ 以本地時區的日期作為彙總鍵 """
+    return time.strftime("%Y-%m-%d", time.localtime(ts))
+
+def _connect(path):
+    conn = sqlite3.connect(path, timeout=5.0, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+class HistoryStore:
+    """
+    訓練歷史資料庫 (SQLite WAL)
+    寫入一律丟進佇列，由背景執行緒批次寫入，呼叫端 (影像迴圈 / GUI) 永遠不會被磁碟 I/O 阻塞；
+    佇列滿時丟棄並計數。讀取在呼叫端執行緒各自開連線，WAL 模式下不會與寫入互相阻塞。
+    """
+    def __init__(self, path=None, flush_interval=0.5, max_batch=2000, max_queue=20000):
+        self.path = path or user_data_path("history.db")
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.dropped = 0
+        self.written = 0
+        self._local = threading.local()
+
+        conn = _connect(self.path)
+        conn.executescript(SCHEMA)
+        conn.close()
+
+        self._writer = threading.Thread(target=self._write_loop, name="HistoryWriter", daemon=True)
+        self._writer.start()
+
+    # --- 寫入 API (非阻塞) ---
+    def _put(self, item):
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            self.dropped += 1
+
+    def start_session(self, ts=None):
+        ts = time.time() if ts is None else ts
+        session_id = int(ts * 1_000_000)
+        self._put(("session_start", session_id, ts))
+        return session_id
+
+    def end_session(self, session_id, started_at, ts=None):
+        self._put(("session_end", session_id, started_at, time.time() if ts is None else ts))
+
+    def log_label(self, session_id, label, ts=None):
+        self._put(("label", session_id, time.time() if ts is None else ts, label))
+
+    def log_hold(self, session_id, label, started_at, duration):
+        self._put(("hold", session_id, label, started_at, duration))
+
+    def log_advice(self, session_id, status, advice, ts=None):
+        self._put(("advice", session_id, time.time() if ts is None else ts, status, advice))
+
+    # --- 背景寫入 ---
+    def _write_loop(self):
+        conn = _connect(self.path)
+        while True:
+            try:
+                first = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            if first is None:
+                self.queue.task_done()
+                break
+            batch = [first]
+            stop = False
+            while len(batch) < self.max_batch:
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    self.queue.task_done()
+                    break
+                batch.append(item)
+            try:
+                self._write_batch(conn, batch)
+                self.written += len(batch)
+            except sqlite3.Error as e:
+                print(f"[History] ❌ 寫入失敗 ({len(batch)} 筆): {e}", flush=True)
+            for _ in batch:
+                self.queue.task_done()
+            if stop:
+                break
+        conn.close()
+
+    def _write_batch(self, conn, batch):
+        """ 一個交易寫入整批明細並同步更新每日彙總 """
+        sessions, ends, labels, holds, advice = [], [], [], [], []
+        daily = {}
+        daily_labels = {}
+
+        def bump(day, **fields):
+            row = daily.setdefault(day, {"sessions": 0, "session_seconds": 0.0, "holds": 0,
+                                         "hold_seconds": 0.0, "label_changes": 0, "advice": 0})
+            for k, v in fields.items():
+                row[k] += v
+
+        for item in batch:
+            kind = item[0]
+            if kind == "session_start":
+                sessions.append(item[1:])
+                bump(day_of(item[2]), sessions=1)
+            elif kind == "session_end":
+                _, sid, started_at, ended_at = item
+                ends.append((ended_at, sid))
+                bump(day_of(started_at), session_seconds=ended_at - started_at)
+            elif kind == "label":
+                labels.append(item[1:])
+                bump(day_of(item[2]), label_changes=1)
+            elif kind == "hold":
+                _, sid, label, started_at, duration = item
+                holds.append(item[1:])
+                day = day_of(started_at)
+                bump(day, holds=1, hold_seconds=duration)
+                row = daily_labels.setdefault((day, label), [0, 0.0, 0.0])
+                row[0] += 1
+                row[1] += duration
+                row[2] = max(row[2], duration)
+            elif kind == "advice":
+                advice.append(item[1:])
+                bump(day_of(item[2]), advice=1)
+
+        with conn:
+            if sessions:
+                conn.executemany("INSERT OR IGNORE INTO sessions (id, started_at) VALUES (?, ?)", sessions)
+            if ends:
+                conn.executemany("UPDATE sessions SET ended_at = ? WHERE id = ?", ends)
+            if labels:
+                conn.executemany("INSERT INTO label_events (session_id, ts, label) VALUES (?, ?, ?)", labels)
+            if holds:
+                conn.executemany("INSERT INTO pose_holds (session_id, label, started_at, duration) VALUES (?, ?, ?, ?)", holds)
+            if advice:
+                conn.executemany("INSERT INTO coach_advice (session_id, ts, status, advice) VALUES (?, ?, ?, ?)", advice)
+            conn.executemany(
+                """INSERT INTO daily_stats (day, sessions, session_seconds, holds, hold_seconds, label_changes, advice)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT(day) DO UPDATE SET
+                       sessions = sessions + excluded.sessions,
+                       session_seconds = session_seconds + excluded.session_seconds,
+                       holds = holds + excluded.holds,
+                       hold_seconds = hold_seconds + excluded.hold_seconds,
+                       label_changes = label_changes + excluded.label_changes,
+                       advice = advice + excluded.advice""",
+                [(d, r["sessions"], r["session_seconds"], r["holds"], r["hold_seconds"], r["label_changes"], r["advice"])
+                 for d, r in daily.items()]
+            )
+            conn.executemany(
+                """INSERT INTO daily_label_stats (day, label, holds, hold_seconds, best_hold)
+                   VALUES (?, ?, ?, ?, ?)
+                   ON CONFLICT(day, label) DO UPDATE SET
+                       holds = holds + excluded.holds,
+                       hold_seconds = hold_seconds + excluded.hold_seconds,
+                       best_hold = MAX(best_hold, excluded.best_hold)""",
+                [(d, label, r[0], r[1], r[2]) for (d, label), r in daily_labels.items()]
+            )
+
+    def flush(self):
+        """ 等待佇列中的事件全部寫入 (基準量測用) """
+        self.queue.join()
+
+    def close(self):
+        self.queue.put(None)
+        self._writer.join(timeout=5.0)
+
+    # --- 查詢 API (呼叫端執行緒) ---
+    def _reader(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = _connect(self.path)
+        return conn
+
+    def calendar(self, year, month):
+        """ 指定月份每天的訓練摘要 {day: {...}} """
+        prefix = f"{year:04d}-{month:02d}-"
+        rows = self._reader().execute(
+            "SELECT day, sessions, session_seconds, holds, hold_seconds, advice FROM daily_stats "
+            "WHERE day >= ? AND day < ? ORDER BY day", (prefix + "00", prefix + "99")
+        ).fetchall()
+        return {r[0]: {"sessions": r[1], "session_seconds": r[2], "holds": r[3], "hold_seconds": r[4], "advice": r[5]}
+                for r in rows}
+
+    def trend(self, days=30, now=None):
+        """ 最近 N 天的每日 (day, hold_seconds, holds, session_seconds) """
+        since = day_of((time.time() if now is None else now) - days * 86400)
+        return self._reader().execute(
+            "SELECT day, hold_seconds, holds, session_seconds FROM daily_stats WHERE day > ? ORDER BY day", (since,)
+        ).fetchall()
+
+    def label_summary(self, days=7, now=None):
+        """ 最近 N 天各姿勢的停留次數、總秒數與最長停留 """
+        since = day_of((time.time() if now is None else now) - days * 86400)
+        return self._reader().execute(
+            "SELECT label, SUM(holds), SUM(hold_seconds), MAX(best_hold) FROM daily_label_stats "
+            "WHERE day > ? GROUP BY label ORDER BY SUM(hold_seconds) DESC", (since,)
+        ).fetchall()
+
+    def recent_advice(self, limit=5):
+        return self._reader().execute(
+            "SELECT ts, status, advice FROM coach_advice ORDER BY ts DESC LIMIT ?", (limit,)
+        ).fetchall()
+
+class SessionRecorder:
+    """
+    將每幀的辨識結果轉成歷史事件：進入運動模式開啟一次練習 (session)，回到操控模式或程式結束時關閉；
+    標籤變化寫入 label_events，同一姿勢持續 min_hold 秒以上視為一次停留 (pose_holds)。
+    每幀只做一次字串比較，開銷可忽略。
+    """
+    IGNORED_LABELS = {"", "請進入畫面", "動作匹配中...", "分析中...", "骨架偵測中...", "手部操控模式"}
+
+    def __init__(self, store, min_hold=2.0):
+        self.store = store
+        self.min_hold = min_hold
+        self.session_id = None
+        self.last_session_id = None   # 教練建議可能在離開運動模式後才回來，歸入最近一次練習
+        self.started_at = None
+        self.label = None
+        self.label_since = None
+
+    def on_frame(self, mode, feedback, ts=None):
+        ts = time.time() if ts is None else ts
+        exercising = mode == "EXERCISE"
+        if exercising and self.session_id is None:
+            self.started_at = ts
+            self.session_id = self.last_session_id = self.store.start_session(ts)
+        label = feedback if exercising else None
+        if label != self.label:
+            self._close_hold(ts)
+            self.label, self.label_since = label, ts
+            if label not in self.IGNORED_LABELS and label is not None:
+                self.store.log_label(self.session_id, label, ts)
+        if not exercising and self.session_id is not None:
+            self._end_session(ts)
+
+    def _close_hold(self, ts):
+        if self.label in self.IGNORED_LABELS or self.label is None:
+            return
+        duration = ts - self.label_since
+        if duration >= self.min_hold:
+            self.store.log_hold(self.session_id, self.label, self.label_since, duration)
+
+    def _end_session(self, ts):
+        self.store.end_session(self.session_id, self.started_at, ts)
+        self.session_id = None
+        self.started_at = None
+
+    def on_advice(self, status, advice):
+        session_id = self.session_id or self.last_session_id
+        if advice and session_id is not None:
+            self.store.log_advice(session_id, status, advice)
+
+    def close(self):
+        now = time.time()
+        if self.session_id is not None:
+            self._close_hold(now)
+            self._end_session(now)
+        self.store.close()
+
+# --- 基準量測 ---
+def _bench(days, path):
+    """ 模擬 days 天的使用紀錄 (每天 2 次、每次 30 分鐘)，量測寫入吞吐量與查詢延遲 """
+    import random
+    rng = random.Random(0)
+    labels = ["正確右平衡", "錯誤右平衡", "正確左側角", "錯誤左側角", "錯誤"]
+    store = HistoryStore(path, max_queue=1_000_000)
+    start = time.time() - days * 86400
+
+    t0 = time.perf_counter()
+    events = 0
+    for d in range(days):
+        for s in range(2):
+            t = start + d * 86400 + (8 + s * 10) * 3600
+            sid = store.start_session(t)
+            end = t + 1800
+            while t < end:
+                hold = rng.uniform(1, 12)
+                label = rng.choice(labels)
+                store.log_label(sid, label, t)
+                store.log_hold(sid, label, t, hold)
+                events += 2
+                if rng.random() < 0.05:
+                    store.log_advice(sid, label, "膝蓋再往外打開一點", t)
+                    events += 1
+                t += hold
+            store.end_session(sid, end - 1800, end)
+            events += 2
+    store.flush()
+    elapsed = time.perf_counter() - t0
+    print(f"[Bench] 寫入 {events} 筆事件 ({days} 天)，耗時 {elapsed:.2f}s，吞吐量 {events / elapsed:,.0f} 筆/秒 (丟棄 {store.dropped})")
+
+    now = time.time()
+    lt = time.localtime(now)
+    conn = store._reader()
+    queries = {
+        "calendar(本月)": lambda: store.calendar(lt.tm_year, lt.tm_mon),
+        "trend(30 天)": lambda: store.trend(30, now),
+        "trend(365 天)": lambda: store.trend(365, now),
+        "label_summary(7 天)": lambda: store.label_summary(7, now),
+        "recent_advice(5)": lambda: store.recent_advice(5),
+        # 對照組：不使用彙總表，直接掃描明細
+        "明細掃描 trend(365 天)": lambda: conn.execute(
+            "SELECT date(started_at, 'unixepoch', 'localtime') AS d, SUM(duration), COUNT(*) FROM pose_holds "
+            "WHERE started_at > ? GROUP BY d", (now - 365 * 86400,)).fetchall(),
+    }
+    for name, fn in queries.items():
+        runs = 20
+        t0 = time.perf_counter()
+        for _ in range(runs):
+            fn()
+        print(f"[Bench] {name:<24} {(time.perf_counter() - t0) / runs * 1000:8.3f} ms")
+    store.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="訓練歷史資料庫")
+    parser.add_argument("--bench", action="store_true", help="以模擬資料量測寫入吞吐量與查詢延遲")
+    parser.add_argument("--days", type=int, default=365, help="模擬天數")
+    args = parser.parse_args()
+    if args.bench:
+        with tempfile.TemporaryDirectory() as tmp:
+            _bench(args.days, os.path.join(tmp, "bench.db"))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,322 @@
+import os
+import sys
+import time
+import queue
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import cv2
+import numpy as np
+
+# 推論行程預設的影格尺寸 (與 VTuberRenderer 畫布一致)
+FRAME_SHAPE = (480, 640, 3)
+
+def _attach_shm(name):
+    """
+    附掛既有的共享記憶體，不由附掛端追蹤。
+    spawn 啟動的子行程與建立者共用同一個 resource_tracker：附掛端若 unregister，
+    會移除建立者自己的登記 (關閉時 tracker 報 KeyError，GUI 當機時 /dev/shm 片段洩漏)。
+    Python 3.13+ 以 track=False 完全不登記；舊版附掛時重複登記到同一 tracker 的集合，
+    不需也不可解除登記，回收一律由建立者 unlink。
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    return shared_memory.SharedMemory(name=name)
+
+class FrameRing:
+    """
+    以 multiprocessing.shared_memory 實作的影格環形緩衝區 (單一寫入者 / 單一讀取者)
+    記憶體佈局: [slots 個 int64 序號][slots 張 uint8 影格]
+    寫入時先將序號設為 -1，寫完再填入序號；讀取端於讀取前後比對序號，被覆寫即丟棄。
+    """
+    def __init__(self, shape=FRAME_SHAPE, slots=4, name=None):
+        self.shape = tuple(shape)
+        self.slots = slots
+        header_bytes = slots * 8
+        size = header_bytes + slots * int(np.prod(self.shape))
+
+        self._owner = name is None
+        if self._owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self.shm = _attach_shm(name)
+
+        self.seqs = np.ndarray((slots,), dtype=np.int64, buffer=self.shm.buf)
+        self.frames = np.ndarray((slots,) + self.shape, dtype=np.uint8, buffer=self.shm.buf, offset=header_bytes)
+        if self._owner:
+            self.seqs[:] = -1
+
+    @property
+    def spec(self):
+        """ 可跨行程傳遞的描述 (供子行程 attach) """
+        return {"name": self.shm.name, "shape": self.shape, "slots": self.slots}
+
+    @classmethod
+    def attach(cls, spec):
+        return cls(spec["shape"], spec["slots"], name=spec["name"])
+
+    def write(self, seq, img):
+        """ 寫入一張影格，尺寸不符時縮放至緩衝區大小 """
+        slot = seq % self.slots
+        if img.shape != self.shape:
+            img = cv2.resize(img, (self.shape[1], self.shape[0]))
+        self.seqs[slot] = -1
+        np.copyto(self.frames[slot], img)
+        self.seqs[slot] = seq
+        return slot
+
+    def read(self, seq, convert=np.copy):
+        """
+        讀取指定序號的影格，convert 直接作用於共享記憶體視圖 (例如轉為 QImage)
+        若影格已被覆寫則回傳 None
+        """
+        slot = seq % self.slots
+        if self.seqs[slot] != seq:
+            return None
+        out = convert(self.frames[slot])
+        if self.seqs[slot] != seq:
+            return None
+        return out
+
+    def close(self):
+        # 先釋放 numpy 視圖，否則 SharedMemory.close 會因 buffer 仍被引用而失敗
+        self.seqs = None
+        self.frames = None
+        self.shm.close()
+        if self._owner:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+
+def _apply_cpu_set(cpu_set):
+    """ 將行程綁定到指定的 CPU 核心，並限制 OpenCV 內部執行緒數量避免超額訂閱 """
+    if not cpu_set:
+        return
+    if hasattr(os, "sched_setaffinity"):
+        try:
+            os.sched_setaffinity(0, cpu_set)
+        except OSError as e:
+            print(f"[Worker] ⚠️ 無法設定 CPU 親和性: {e}", flush=True)
+    cv2.setNumThreads(len(cpu_set))
+
+def worker_main(raw_spec, vt_spec, result_q, control_q, stop_event, config, coach_q=None):
+    """
+    推論子行程進入點：擷取 + MediaPipe + XGBoost + 繪圖皆在此執行，
+    影格寫入共享記憶體，結果以輕量訊息送回 GUI 行程。
+    raw_spec / vt_spec 為 None 時以無畫面 (headless) 模式執行。
+    config 可選鍵值:
+    - camera: 攝影機索引
+    - cpu_set: 綁定的 CPU 核心
+    - max_fps: 每秒最多處理的影格數 (多站點時平衡 CPU)
+    - stats_interval: 回報吞吐量的間隔秒數
+    - station_id: 多站點模式下的站點編號 (搭配 coach_q 於子行程內節流教練請求)
+    """
+    from core.state import SystemState
+    from core.pipeline import build_pipeline, STATUS_OUTPUTS
+    from core.coach_throttle import CoachThrottle
+    from core.capture import CameraSource, CaptureConfig
+
+    _apply_cpu_set(config.get("cpu_set"))
+    raw_ring = FrameRing.attach(raw_spec) if raw_spec else None
+    vt_ring = FrameRing.attach(vt_spec) if vt_spec else None
+    state = SystemState()
+    # 無畫面模式只訂閱狀態輸出，繪圖階段不會被排程
+    outputs = STATUS_OUTPUTS + (("anno_frame",) if raw_ring else ()) + (("vt_frame",) if vt_ring else ())
+    engine, stages = build_pipeline(state, config["model_path"], config["labels_path"], subscriptions=outputs)
+    station_id = config.get("station_id")
+    throttle = CoachThrottle(config.get("coach_cooldown", 15.0))
+
+    cap = CameraSource(CaptureConfig(device=config.get("camera", 0)))
+    if not cap.open():
+        print(f"[Worker] ❌ 錯誤：無法開啟攝影機 {config.get('camera', 0)}", flush=True)
+        result_q.put(("error", "camera"))
+        engine.close()
+        return
+    stages.source = cap
+
+    min_interval = 1.0 / config["max_fps"] if config.get("max_fps") else 0.0
+    stats_interval = config.get("stats_interval", 0)
+    seq = config.get("seq_base", 0)
+    last_time = time.time()
+    stats_start, stats_frames, stats_busy = last_time, 0, 0.0
+    result_q.put(("ready", seq))
+    # GUI 行程異常結束時不會設定 stop_event，也不會執行 atexit 終止 daemon 子行程：
+    # 自行偵測父行程消失並退出，避免孤兒行程持續佔用攝影機
+    parent = mp.parent_process()
+    try:
+        while not stop_event.is_set():
+            if parent is not None and not parent.is_alive():
+                print("[Worker] ⚠️ 父行程已結束，推論行程自行退出", flush=True)
+                break
+            # 同步 GUI 端的模式與頁面
+            try:
+                while True:
+                    state.mode, state.current_page = control_q.get_nowait()
+            except queue.Empty:
+                pass
+
+            t0 = time.time()
+            ctx = engine.run_once()
+            if ctx is None:
+                continue
+
+            has_vt = "vt_frame" in ctx
+            if raw_ring is not None:
+                raw_ring.write(seq, ctx["anno_frame"])
+            if vt_ring is not None and has_vt:
+                vt_ring.write(seq, ctx["vt_frame"])
+            feedback, pose_landmarks, cmd = ctx["feedback"], ctx["pose_landmarks"], ctx["gesture_cmd"]
+
+            curr_time = time.time()
+            fps = 1.0 / (curr_time - last_time) if (curr_time - last_time) > 0 else 0
+            last_time = curr_time
+            stats_frames += 1
+            stats_busy += curr_time - t0
+
+            # 手勢指令不可遺失；一般影格結果在 GUI 落後時直接丟棄
+            if cmd:
+                result_q.put(("cmd", cmd))
+            try:
+                result_q.put_nowait(("frame", seq, ctx["mode"], has_vt, ctx["is_active"], fps, feedback,
+                                     ctx["hand_x"], ctx["hand_y"], pose_landmarks, ctx["metrics"]))
+            except queue.Full:
+                pass
+
+            # 多站點：教練請求先經站點自身節流，再送入共享的限流佇列
+            if coach_q is not None and state.mode == "EXERCISE" and throttle.should_trigger(feedback, pose_landmarks):
+                throttle.mark(feedback)
+                try:
+                    coach_q.put_nowait((station_id, feedback, pose_landmarks, ctx["metrics"], curr_time))
+                except queue.Full:
+                    pass
+
+            if stats_interval and curr_time - stats_start >= stats_interval:
+                elapsed = curr_time - stats_start
+                try:
+                    result_q.put_nowait(("stats", stats_frames, stats_frames / elapsed, stats_busy / stats_frames * 1000))
+                except queue.Full:
+                    pass
+                stats_start, stats_frames, stats_busy = curr_time, 0, 0.0
+
+            seq += 1
+            if min_interval:
+                remain = min_interval - (time.time() - t0)
+                if remain > 0:
+                    time.sleep(remain)
+    finally:
+        cap.release()
+        engine.close()
+        if raw_ring is not None:
+            raw_ring.close()
+        if vt_ring is not None:
+            vt_ring.close()
+
+class InferenceProcess:
+    """
+    GUI 行程端的推論行程管理器：負責共享記憶體配置、啟動、關閉與當機重啟
+    """
+    MAX_BACKOFF = 8.0
+
+    def __init__(self, model_path, labels_path, camera=0, slots=4, headless=False, coach_q=None, ctx=None, **options):
+        self.ctx = ctx or mp.get_context("spawn")
+        self.config = {"model_path": model_path, "labels_path": labels_path, "camera": camera}
+        self.config.update(options)
+        self.raw_ring = None if headless else FrameRing(FRAME_SHAPE, slots)
+        self.vt_ring = None if headless else FrameRing(FRAME_SHAPE, slots)
+        self.coach_q = coach_q
+        self.result_q = self.ctx.Queue(maxsize=slots)
+        self.control_q = self.ctx.Queue()
+        self.stop_event = self.ctx.Event()
+        self.process = None
+        self.generation = 0
+        self.restarts = 0
+        self.frames_skipped = 0   # drain 時被較新影格取代、未轉換的影格訊息數
+        self._backoff = 0.5
+        self._next_start = 0.0
+        self._last_state = None
+
+    def start(self):
+        # 每一代行程使用獨立的序號區段，避免舊訊息誤讀新影格
+        self.config["seq_base"] = self.generation << 32
+        self.generation += 1
+        self.stop_event.clear()
+        self._last_state = None
+        self.process = self.ctx.Process(
+            target=worker_main,
+            args=(
+                self.raw_ring.spec if self.raw_ring else None,
+                self.vt_ring.spec if self.vt_ring else None,
+                self.result_q, self.control_q, self.stop_event, self.config, self.coach_q
+            ),
+            daemon=True
+        )
+        self.process.start()
+        print(f"[Inference] 🚀 推論行程已啟動 (PID {self.process.pid})", flush=True)
+
+    def sync_state(self, state):
+        """ 僅在模式或頁面變動時送出控制訊息 """
+        current = (state.mode, state.current_page)
+        if current != self._last_state:
+            self.control_q.put(current)
+            self._last_state = current
+
+    def ensure_alive(self):
+        """ 行程異常結束時以指數退避重新啟動 """
+        if self.process is None or self.process.is_alive() or self.stop_event.is_set():
+            return
+        now = time.time()
+        if self._next_start == 0.0:
+            print(f"[Inference] ⚠️ 推論行程結束 (exitcode={self.process.exitcode})，{self._backoff:.1f}s 後重啟", flush=True)
+            self._next_start = now + self._backoff
+            return
+        if now >= self._next_start:
+            self.restarts += 1
+            self._backoff = min(self._backoff * 2, self.MAX_BACKOFF)
+            self._next_start = 0.0
+            self.start()
+
+    def poll(self, timeout=0.1):
+        """ 取得下一則結果訊息，逾時回傳 None """
+        try:
+            msg = self.result_q.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        if msg[0] == "ready":
+            self._backoff = 0.5
+        return msg
+
+    def drain(self, timeout=0.1):
+        """
+        等待第一則訊息後取走佇列中已到達的其餘訊息；影格訊息只保留最新一則
+        (GUI 落後時舊影格不必再讀共享記憶體與轉換)，其他訊息 (手勢指令、錯誤) 依序全部保留
+        """
+        msg = self.poll(timeout)
+        if msg is None:
+            return []
+        msgs = [msg]
+        while True:
+            try:
+                msg = self.result_q.get_nowait()
+            except queue.Empty:
+                break
+            if msg[0] == "ready":
+                self._backoff = 0.5
+            msgs.append(msg)
+        frames = [i for i, m in enumerate(msgs) if m[0] == "frame"]
+        if len(frames) > 1:
+            self.frames_skipped += len(frames) - 1
+            stale = set(frames[:-1])
+            msgs = [m for i, m in enumerate(msgs) if i not in stale]
+        return msgs
+
+    def stop(self, timeout=3.0):
+        self.stop_event.set()
+        if self.process is not None:
+            self.process.join(timeout)
+            if self.process.is_alive():
+                self.process.terminate()
+                self.process.join(1.0)
+        for ring in (self.raw_ring, self.vt_ring):
+            if ring is not None:
+                ring.close()
+        print("[Inference] 推論行程已關閉", flush=True)
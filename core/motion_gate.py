@@ -0,0 +1,80 @@
+import time
+import cv2
+import numpy as np
+
+class MotionGate:
+    """
+    手部偵測前的低成本閘門：縮小影格做幀差，移動區域內有膚色才視為「有人操作」。
+    - 追蹤到手或近期有活動：每幀都送 Hands 模型
+    - 閒置：以 idle_hz 低頻偵測 (仍能發現靜止伸入畫面的手)
+    並統計實際送入模型的比例 (duty cycle)。
+    """
+    # YCrCb 膚色範圍 (常用經驗值)
+    SKIN_LOW = np.array([0, 133, 77], dtype=np.uint8)
+    SKIN_HIGH = np.array([255, 173, 127], dtype=np.uint8)
+
+    def __init__(self, size=(80, 60), diff_threshold=18, motion_ratio=0.01, skin_ratio=0.15,
+                 idle_hz=2.0, active_hold=1.5, report_interval=30.0):
+        self.size = size
+        self.diff_threshold = diff_threshold
+        self.motion_ratio = motion_ratio      # 移動像素佔比門檻
+        self.skin_ratio = skin_ratio          # 移動區域中膚色像素佔比門檻
+        self.idle_interval = 1.0 / idle_hz
+        self.active_hold = active_hold        # 活動結束後維持全速偵測的秒數
+        self.report_interval = report_interval
+
+        self._prev = None
+        self._active_until = 0.0
+        self._last_detect = 0.0
+        self._frames = 0
+        self._detections = 0
+        self._report_start = None
+
+    def _has_activity(self, frame):
+        small = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+        gray = cv2.GaussianBlur(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), (5, 5), 0)
+        prev, self._prev = self._prev, gray
+        if prev is None:
+            return False
+
+        motion = cv2.absdiff(gray, prev) > self.diff_threshold
+        if motion.mean() < self.motion_ratio:
+            return False
+
+        skin = cv2.inRange(cv2.cvtColor(small, cv2.COLOR_BGR2YCrCb), self.SKIN_LOW, self.SKIN_HIGH) > 0
+        return skin[motion].mean() >= self.skin_ratio
+
+    def should_detect(self, frame, hand_tracked, now=None):
+        """ 判斷此幀是否需要執行手部偵測 """
+        now = time.monotonic() if now is None else now
+        if self._report_start is None:
+            self._report_start = now
+
+        if self._has_activity(frame):
+            self._active_until = now + self.active_hold
+
+        if hand_tracked or now < self._active_until:
+            detect = True
+        else:
+            detect = now - self._last_detect >= self.idle_interval
+
+        self._frames += 1
+        if detect:
+            self._detections += 1
+            self._last_detect = now
+
+        if now - self._report_start >= self.report_interval:
+            print(f"[MotionGate] 手部偵測工作比: {self.duty_cycle * 100:.1f}% ({self._detections}/{self._frames})", flush=True)
+            self._frames = 0
+            self._detections = 0
+            self._report_start = now
+        return detect
+
+    @property
+    def duty_cycle(self):
+        """ 目前統計區間內實際執行偵測的影格比例 """
+        return self._detections / self._frames if self._frames else 0.0
+
+    def reset(self):
+        """ 切換模式時清除前一幀，避免以過期影格計算幀差 """
+        self._prev = None
@@ -0,0 +1,307 @@
+import sys
+import time
+import argparse
+import cv2
+import numpy as np
+import mediapipe as mp
+from ai.models import PoseEngine, VTuberRenderer
+from ai.biomechanics import BiomechanicsTracker
+from core.gesture_engine import GestureEngine, hand_landmarks_to_array
+from core.motion_gate import MotionGate
+
+# 提供給 AI 教練的關鍵關節 (11,12:肩 | 25,26:膝 | 27,28:踝)
+COACH_TARGETS = {"L_Shoulder": 11, "R_Shoulder": 12, "L_Knee": 25, "R_Knee": 26, "L_Ankle": 27, "R_Ankle": 28}
+
+# 每幀 context 的預設值：階段未執行時下游仍可安全讀取
+CONTEXT_DEFAULTS = {
+    "skeleton": None,
+    "pose_detected": False,
+    "feedback": "",
+    "is_active": False,
+    "hand_x": -1.0,
+    "hand_y": -1.0,
+    "gesture_cmd": None,
+    "metrics": None,
+}
+
+# 影像處理執行緒一定會用到的狀態輸出 (提示列、懸停、教練、手勢指令、關節角度摘要)
+STATUS_OUTPUTS = ("feedback", "is_active", "hand_x", "hand_y", "pose_landmarks", "gesture_cmd", "metrics")
+
+class Stage:
+    """
+    宣告式處理階段
+    fn: 接收每幀 context (dict) 並寫入 outputs；回傳 False 代表本幀中止 (例如擷取失敗)
+    modes: 啟用此階段的 SystemState.mode 集合，None 表示所有模式
+    """
+    def __init__(self, name, fn, inputs=(), outputs=(), modes=None):
+        self.name = name
+        self.fn = fn
+        self.inputs = tuple(inputs)
+        self.outputs = tuple(outputs)
+        self.modes = set(modes) if modes else None
+
+    def active(self, mode):
+        return self.modes is None or mode in self.modes
+
+class PipelineEngine:
+    """
+    依模式與訂閱狀態排程的處理圖：
+    由被訂閱的輸出往回推導需要的階段，沒有消費者的工作 (例如沒有畫面訂閱時的繪圖與 QImage 轉換) 完全略過。
+    不依賴 Qt，可於無畫面環境以任意影像來源測試。
+    """
+    def __init__(self, stages, state, subscriptions=(), closers=()):
+        self.stages = list(stages)
+        self.state = state
+        self.subscriptions = set(subscriptions)
+        self.closers = list(closers)
+        self.timings = {}        # 各階段最近一次耗時 (ms)
+        self._plans = {}
+
+    def subscribe(self, output):
+        self.subscriptions.add(output)
+
+    def unsubscribe(self, output):
+        self.subscriptions.discard(output)
+
+    def set_subscribed(self, output, subscribed):
+        if subscribed:
+            self.subscriptions.add(output)
+        else:
+            self.subscriptions.discard(output)
+
+    def plan(self, mode):
+        """ 回傳此模式與訂閱組合下需要執行的階段 (依宣告順序)，結果會被快取 """
+        key = (mode, frozenset(self.subscriptions))
+        plan = self._plans.get(key)
+        if plan is None:
+            needed = set(self.subscriptions)
+            selected = []
+            for stage in reversed(self.stages):
+                if stage.active(mode) and needed.intersection(stage.outputs):
+                    selected.append(stage)
+                    needed.update(stage.inputs)
+            plan = self._plans[key] = list(reversed(selected))
+        return plan
+
+    def run_once(self):
+        """ 執行一幀，回傳 context；擷取失敗時回傳 None """
+        mode = self.state.mode
+        ctx = dict(CONTEXT_DEFAULTS)
+        ctx["mode"] = mode
+        ctx["pose_landmarks"] = {}
+        for stage in self.plan(mode):
+            t0 = time.perf_counter()
+            if stage.fn(ctx) is False:
+                return None
+            self.timings[stage.name] = (time.perf_counter() - t0) * 1000
+        return ctx
+
+    def close(self):
+        for closer in self.closers:
+            closer()
+
+class YogaStages:
+    """
+    瑜珈教練的各處理階段實作 (擷取 / 翻轉 / 姿勢 / 分類 / 手勢 / 繪製 / 編碼)
+    source: 具有 read() -> (ret, frame) 的影像來源 (CameraSource、cv2.VideoCapture 或測試用假來源)
+    encoder: ndarray -> 顯示用影像 (例如 QImage)；None 表示不提供編碼輸出
+    max_hands / hand_policy: 同時追蹤的手數與操控權策略 (first / largest / center)
+    """
+    def __init__(self, state, model_path, labels_path, source=None, encoder=None, pose_rate_hz=15.0,
+                 max_hands=2, hand_policy="first"):
+        self.state = state
+        self.source = source
+        self.encoder = encoder
+        # 姿勢偵測以 15 Hz 執行，其餘影格由濾波器外插，骨架與 VTuber 仍以攝影機幀率更新
+        self.pose = PoseEngine(model_path=model_path, labels_path=labels_path, pose_rate_hz=pose_rate_hz)
+        self.vt = VTuberRenderer()
+        self.blank_vt = self.vt.render(None)
+        self.biomech = BiomechanicsTracker()
+        self.gesture_engine = GestureEngine(owner_policy=hand_policy)
+
+        self.mp_hands = mp.solutions.hands
+        self.hands = self.mp_hands.Hands(
+            static_image_mode=False,
+            max_num_hands=max_hands,
+            min_detection_confidence=0.7,
+            min_tracking_confidence=0.5
+        )
+        # 操控模式下以幀差 + 膚色判斷是否需要執行手部模型
+        self.motion_gate = MotionGate()
+        self._hand_tracked = False
+        self._frame_size = None
+
+    def set_frame_size(self, width, height):
+        """ 關鍵點 x 以畫面寬度歸一化：角度特徵與生物力學指標改用實際畫面的寬高比 """
+        self._frame_size = (width, height)
+        aspect = width / height
+        self.pose.aspect = aspect
+        self.biomech.kinematics.aspect = aspect
+        self.biomech.reset()   # 比例改變前後的角度不可相減成角速度
+
+    # --- 階段實作 ---
+    def capture(self, ctx):
+        ret, frame = self.source.read()
+        if not ret:
+            return False
+        ctx["frame_raw"] = frame
+        # 以實際送達的影格尺寸為準 (協商結果或重新連線後可能不是 4:3)，尺寸不變時只是一次比較
+        if (frame.shape[1], frame.shape[0]) != self._frame_size:
+            self.set_frame_size(frame.shape[1], frame.shape[0])
+        # CameraSource 提供擷取時間戳；一般來源以讀取完成時間代替
+        ctx["capture_ts"] = getattr(self.source, "last_timestamp", None) or time.monotonic()
+
+    def flip(self, ctx):
+        ctx["frame"] = cv2.flip(ctx["frame_raw"], 1)
+
+    def pose_detect(self, ctx):
+        self._hand_tracked = False
+        self.motion_gate.reset()
+        skeleton, detected = self.pose.detect(ctx["frame"], ctx["capture_ts"])
+        ctx["skeleton"] = skeleton
+        ctx["pose_detected"] = detected
+        if skeleton:
+            # 1. 提取右食指位置供懸浮控制
+            r_idx = skeleton.landmark[20]
+            if r_idx.visibility > 0.5:
+                ctx["hand_x"], ctx["hand_y"] = r_idx.x, r_idx.y
+
+            # 2. 提取關鍵關節座標供 AI 建議使用
+            for name, idx in COACH_TARGETS.items():
+                lm = skeleton.landmark[idx]
+                if lm.visibility > 0.5:
+                    ctx["pose_landmarks"][name] = [lm.x, lm.y]
+
+    def classify(self, ctx):
+        ctx["feedback"] = self.pose.classify(ctx["skeleton"], ctx["pose_detected"])
+
+    def biomechanics(self, ctx):
+        points = self.pose.points
+        if points is None:
+            self.biomech.reset()
+            return
+        ctx["metrics"] = self.biomech.update(ctx["capture_ts"], points, ctx["feedback"])
+
+    def hands_detect(self, ctx):
+        ctx["feedback"] = "手部操控模式"
+        frame = ctx["frame"]
+        if not self.motion_gate.should_detect(frame, self._hand_tracked):
+            return
+        results = self.hands.process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+        self._hand_tracked = bool(results.multi_hand_landmarks)
+        if results.multi_hand_landmarks:
+            points = hand_landmarks_to_array(results.multi_hand_landmarks)
+            # 第二個人的手進入畫面時由操控權策略決定誰的手勢有效
+            ctx["gesture_cmd"], owner = self.gesture_engine.update(points, self.state.current_page)
+            if owner is not None:
+                ctx["hand_x"], ctx["hand_y"] = float(points[owner, 8, 0]), float(points[owner, 8, 1])
+        else:
+            # 偵測有執行但沒看到手：仍需更新一次，讓既有軌跡老化移除、揮動狀態重置
+            ctx["gesture_cmd"], _ = self.gesture_engine.update(np.empty((0, 21, 3), dtype=np.float32),
+                                                                self.state.current_page)
+
+    def render_raw(self, ctx):
+        skeleton = ctx["skeleton"]
+        ctx["anno_frame"] = self.pose.draw(ctx["frame"], skeleton) if skeleton is not None else ctx["frame"]
+
+    def render_vt(self, ctx):
+        skeleton = ctx["skeleton"]
+        ctx["vt_frame"] = self.vt.render(skeleton) if skeleton is not None else self.blank_vt
+
+    def encode_raw(self, ctx):
+        ctx["raw_image"] = self.encoder(ctx["anno_frame"])
+
+    def encode_vt(self, ctx):
+        ctx["vt_image"] = self.encoder(ctx["vt_frame"])
+
+    def stages(self):
+        """ 宣告處理圖 (順序即執行順序) """
+        stages = [
+            Stage("capture", self.capture, outputs=("frame_raw", "capture_ts")),
+            Stage("flip", self.flip, inputs=("frame_raw",), outputs=("frame",)),
+            Stage("pose", self.pose_detect, inputs=("frame", "capture_ts"),
+                  outputs=("skeleton", "pose_detected", "hand_x", "hand_y", "pose_landmarks"), modes=("EXERCISE",)),
+            Stage("classify", self.classify, inputs=("skeleton", "pose_detected"), outputs=("feedback",), modes=("EXERCISE",)),
+            Stage("biomech", self.biomechanics, inputs=("skeleton", "capture_ts", "feedback"), outputs=("metrics",), modes=("EXERCISE",)),
+            Stage("hands", self.hands_detect, inputs=("frame",),
+                  outputs=("feedback", "is_active", "hand_x", "hand_y", "gesture_cmd"), modes=("CONTROL",)),
+            Stage("render_raw", self.render_raw, inputs=("frame", "skeleton"), outputs=("anno_frame",)),
+            # 操控模式沒有骨架，VTuber 畫布固定為黑底，由消費端在切換模式時顯示 blank_vt 一次即可
+            Stage("render_vt", self.render_vt, inputs=("skeleton",), outputs=("vt_frame",), modes=("EXERCISE",)),
+        ]
+        if self.encoder is not None:
+            stages += [
+                Stage("encode_raw", self.encode_raw, inputs=("anno_frame",), outputs=("raw_image",)),
+                Stage("encode_vt", self.encode_vt, inputs=("vt_frame",), outputs=("vt_image",), modes=("EXERCISE",)),
+            ]
+        return stages
+
+    def close(self):
+        self.hands.close()
+
+def build_pipeline(state, model_path, labels_path, source=None, encoder=None, subscriptions=STATUS_OUTPUTS, **options):
+    """ 建立預設的瑜珈處理圖，回傳 (engine, stages) """
+    stages = YogaStages(state, model_path, labels_path, source=source, encoder=encoder, **options)
+    engine = PipelineEngine(stages.stages(), state, subscriptions=subscriptions, closers=(stages.close,))
+    return engine, stages
+
+def self_check():
+    """
+    無畫面檢查：以實際宣告的處理圖 (階段函式換成記錄器，不載入模型與攝影機)
+    確認切換模式 / 取消畫面訂閱時，繪製與編碼階段確實不再執行。回傳失敗訊息列表。
+    """
+    class _State:
+        mode = "EXERCISE"
+
+    declared = YogaStages.__new__(YogaStages)
+    declared.encoder = lambda frame: frame
+    ran = []
+    def recorder(name):
+        def fn(ctx):
+            ran.append(name)
+        return fn
+    state = _State()
+    engine = PipelineEngine([Stage(st.name, recorder(st.name), st.inputs, st.outputs, st.modes)
+                             for st in declared.stages()], state, subscriptions=STATUS_OUTPUTS)
+
+    display = {"render_raw", "render_vt", "encode_raw", "encode_vt"}
+    cases = [
+        ("EXERCISE", (), set()),
+        ("EXERCISE", ("raw_image", "vt_image"), display),
+        ("CONTROL", ("raw_image", "vt_image"), {"render_raw", "encode_raw"}),
+        ("CONTROL", (), set()),
+        ("EXERCISE", ("raw_image",), {"render_raw", "encode_raw"}),
+        ("EXERCISE", (), set()),
+    ]
+    failures = []
+    for mode, views, expected in cases:
+        state.mode = mode
+        for output in ("raw_image", "vt_image"):
+            engine.set_subscribed(output, output in views)
+        del ran[:]
+        engine.run_once()
+        got = display.intersection(ran)
+        if got != expected:
+            failures.append(f"{mode} 訂閱 {views or '無畫面'}: 預期 {sorted(expected)}，實際 {sorted(got)}")
+        if mode == "CONTROL" and {"pose", "classify", "biomech"}.intersection(ran):
+            failures.append(f"CONTROL 模式仍執行了姿勢階段: {ran}")
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description="處理圖工具")
+    parser.add_argument("--selftest", action="store_true", help="無畫面檢查模式 / 訂閱切換時的階段排程")
+    args = parser.parse_args()
+
+    if args.selftest:
+        failures = self_check()
+        for failure in failures:
+            print(f"[Pipeline] ❌ {failure}", flush=True)
+        if failures:
+            return 1
+        print("[Pipeline] ✅ 模式與訂閱切換的階段排程正確", flush=True)
+        return 0
+    parser.print_help()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,335 @@
+import os
+import gc
+import sys
+import csv
+import json
+import time
+import argparse
+import tempfile
+import threading
+import tracemalloc
+import cv2
+import numpy as np
+from core.state import SystemState
+from core.pipeline import build_pipeline, STATUS_OUTPUTS
+from ai.llm_engine import build_coach_query
+
+# --- 1. 影像來源 ---
+class SyntheticSource:
+    """ 合成影格來源：移動的色塊與雜訊，可選擇以固定幀率送出 """
+    def __init__(self, width=640, height=480, fps=30.0, realtime=True):
+        self.width = width
+        self.height = height
+        self.interval = 1.0 / fps if realtime and fps else 0.0
+        self.rng = np.random.default_rng(0)
+        self.base = self.rng.integers(0, 40, size=(height, width, 3), dtype=np.uint8)
+        self.frame = np.empty_like(self.base)
+        self.n = 0
+        self._next = time.monotonic()
+        self.last_timestamp = None
+
+    def read(self):
+        if self.interval:
+            delay = self._next - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            self._next = max(self._next + self.interval, time.monotonic() - self.interval)
+        np.copyto(self.frame, self.base)
+        x = int((np.sin(self.n / 30.0) * 0.4 + 0.5) * self.width)
+        cv2.rectangle(self.frame, (x - 40, 120), (x + 40, 360), (120, 160, 210), -1)
+        self.n += 1
+        self.last_timestamp = time.monotonic()
+        return True, self.frame.copy()
+
+class LoopingVideoSource:
+    """ 重複播放錄影檔 (實際動作畫面，可觸發完整的姿勢偵測路徑) """
+    def __init__(self, path):
+        self.path = path
+        self.cap = cv2.VideoCapture(path)
+        if not self.cap.isOpened():
+            raise ValueError(f"無法開啟影片: {path}")
+        self.last_timestamp = None
+
+    def read(self):
+        ret, frame = self.cap.read()
+        if not ret:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = self.cap.read()
+        self.last_timestamp = time.monotonic()
+        return ret, frame
+
+# --- 2. 量測工具 ---
+def read_rss_mb():
+    """ 目前常駐記憶體 (MB)；優先使用 psutil，其次 /proc，最後退回 ru_maxrss (峰值) """
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 1024 ** 2
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 ** 2
+    except (OSError, ValueError):
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss / 1024 ** 2 if sys.platform == "darwin" else rss / 1024
+
+class GCPauseMonitor:
+    """ 透過 gc.callbacks 量測每次垃圾回收的停頓時間 (依世代統計) """
+    def __init__(self):
+        self._start = None
+        self.pauses = {0: [], 1: [], 2: []}
+
+    def _callback(self, phase, info):
+        if phase == "start":
+            self._start = time.perf_counter()
+        elif self._start is not None:
+            self.pauses[info["generation"]].append((time.perf_counter() - self._start) * 1000)
+            self._start = None
+
+    def install(self):
+        gc.callbacks.append(self._callback)
+
+    def uninstall(self):
+        if self._callback in gc.callbacks:
+            gc.callbacks.remove(self._callback)
+
+    def drain(self):
+        """ 回傳並清空本區間的統計 {gen: (次數, 最大 ms, 總 ms)} """
+        out = {g: (len(p), max(p) if p else 0.0, sum(p)) for g, p in self.pauses.items()}
+        self.pauses = {0: [], 1: [], 2: []}
+        return out
+
+class FakeCoach:
+    """ 不連網的教練替身：模擬回應延遲，用來重現每次請求建立一個工作執行緒的配置模式 """
+    def __init__(self, delay=0.5):
+        self.delay = delay
+
+    def ask(self, query):
+        time.sleep(self.delay)
+        return f"保持呼吸，維持姿勢 ({len(query)} 字)"
+
+def growth_trend(times_h, values):
+    """ 最小平方法斜率 (單位/小時) 與上升區間比例 """
+    if len(values) < 3:
+        return 0.0, 0.0
+    t = np.asarray(times_h)
+    v = np.asarray(values)
+    slope = float(np.polyfit(t, v, 1)[0])
+    rising = float(np.mean(np.diff(v) > 0))
+    return slope, rising
+
+# --- 3. 長時間測試 ---
+class SoakRunner:
+    """
+    以合成或錄影來源長時間驅動處理管線 (含繪圖與影像編碼)，定期取樣：
+    RSS、tracemalloc 總量與成長最多的配置位置、各世代 GC 停頓。
+    結束時判斷是否有單調成長 (疑似洩漏) 與配置熱點。
+    qt=True 時在 QCoreApplication (offscreen) 下以 app.to_qimg 編碼並啟動真正的 LLMWorker，
+    量得到 QImage 副本與 QThread 物件的配置；qt=False (未安裝 PyQt6) 時改用 ndarray 副本與
+    threading.Thread 近似，Qt 特有的洩漏不會出現在結果中 (報告的 qt 欄位會標示)。
+    """
+    def __init__(self, source, hours, interval, model_path, labels_path, mode_switch=300.0,
+                 trace=True, trace_frames=1, top=10, warmup=120.0, encode=True, coach_interval=0.0, qt=True):
+        self.source = source
+        self.duration = hours * 3600
+        self.interval = interval
+        self.mode_switch = mode_switch
+        self.trace = trace
+        self.trace_frames = trace_frames
+        self.top = top
+        self.warmup = warmup
+        self.coach_interval = coach_interval
+        self.coach = FakeCoach()
+        self.state = SystemState()
+        self.state.mode = "EXERCISE"
+        outputs = STATUS_OUTPUTS + ("anno_frame", "vt_frame")
+        if encode:
+            outputs += ("raw_image", "vt_image")
+        self.qt_app = None
+        self.gui = None
+        self._current_llm_worker = None
+        self.advice_count = 0
+        if qt:
+            # 與 GUI 相同的 QImage 轉換與 LLMWorker；QCoreApplication 不需要顯示器
+            os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+            from PyQt6.QtCore import QCoreApplication
+            import app as gui
+            self.qt_app = QCoreApplication.instance() or QCoreApplication(sys.argv[:1])
+            self.gui = gui
+            encoder = gui.to_qimg if encode else None
+        else:
+            # 無 Qt 時的近似：每幀配置一份 ndarray 副本
+            encoder = (lambda img: img.copy()) if encode else None
+        self.engine, self.stages = build_pipeline(
+            self.state, model_path, labels_path, source=source, encoder=encoder, subscriptions=outputs
+        )
+        self.gc_monitor = GCPauseMonitor()
+        self.samples = []
+        self.hotspots = []
+
+    def run(self):
+        if self.trace:
+            tracemalloc.start(self.trace_frames)
+        self.gc_monitor.install()
+        baseline = None
+        start = time.monotonic()
+        next_sample = start + self.interval
+        next_switch = start + self.mode_switch if self.mode_switch else None
+        next_coach = start + self.coach_interval if self.coach_interval else None
+        frames = 0
+        window_frames = 0
+        try:
+            while True:
+                now = time.monotonic()
+                if now - start >= self.duration:
+                    break
+                if next_switch and now >= next_switch:
+                    self.state.toggle_mode()
+                    next_switch += self.mode_switch
+
+                ctx = self.engine.run_once()
+                if self.qt_app is not None:
+                    # 與 GUI 事件迴圈相同：處理跨執行緒 finished 訊號與 deleteLater
+                    self.qt_app.processEvents()
+                if ctx is not None:
+                    frames += 1
+                    window_frames += 1
+                    if next_coach and now >= next_coach:
+                        self._ask_coach(ctx)
+                        next_coach += self.coach_interval
+
+                if now >= next_sample:
+                    elapsed = now - start
+                    if baseline is None and self.trace and elapsed >= self.warmup:
+                        # 暖機後的快照作為比較基準，排除模型載入等一次性配置
+                        baseline = tracemalloc.take_snapshot()
+                    self._sample(elapsed, frames, window_frames / self.interval)
+                    window_frames = 0
+                    next_sample += self.interval
+        except KeyboardInterrupt:
+            print("\n[Soak] 中斷，輸出目前結果", flush=True)
+        finally:
+            self.gc_monitor.uninstall()
+            self.engine.close()
+            if self._current_llm_worker is not None:
+                self._current_llm_worker.wait()
+
+        if self.trace and baseline is not None:
+            snapshot = tracemalloc.take_snapshot()
+            stats = snapshot.compare_to(baseline, "lineno")
+            self.hotspots = [
+                {"location": str(s.traceback), "size_diff_kb": s.size_diff / 1024, "count_diff": s.count_diff}
+                for s in stats[:self.top] if s.size_diff > 0
+            ]
+        if self.trace:
+            tracemalloc.stop()
+        return self.report()
+
+    def _ask_coach(self, ctx):
+        """ 與 GUI 相同：每次教練請求建立一個 LLMWorker，參照存在 _current_llm_worker (同 ui._current_llm_worker) """
+        if self.gui is not None:
+            worker = self.gui.LLMWorker(self.coach, ctx["feedback"], ctx["pose_landmarks"], ctx["metrics"])
+            worker.finished.connect(self._on_advice)
+            self._current_llm_worker = worker
+            worker.start()
+            return
+        def run(status, landmarks, metrics):
+            self.coach.ask(build_coach_query(status, landmarks, metrics))
+        threading.Thread(target=run, args=(ctx["feedback"], ctx["pose_landmarks"], ctx["metrics"]), daemon=True).start()
+
+    def _on_advice(self, text):
+        self.advice_count += 1
+
+    def _sample(self, elapsed, frames, fps):
+        gc_stats = self.gc_monitor.drain()
+        sample = {
+            "elapsed_h": elapsed / 3600,
+            "frames": frames,
+            "fps": fps,
+            "rss_mb": read_rss_mb(),
+            "gc_objects": len(gc.get_objects()),
+        }
+        if self.trace:
+            current, peak = tracemalloc.get_traced_memory()
+            sample["traced_mb"] = current / 1024 ** 2
+            sample["traced_peak_mb"] = peak / 1024 ** 2
+        for gen, (count, worst, total) in gc_stats.items():
+            sample[f"gc{gen}_count"] = count
+            sample[f"gc{gen}_max_ms"] = worst
+            sample[f"gc{gen}_total_ms"] = total
+        self.samples.append(sample)
+        print(f"[Soak] {elapsed / 60:7.1f} 分 | FPS {fps:5.1f} | RSS {sample['rss_mb']:8.1f} MB | "
+              f"traced {sample.get('traced_mb', 0):7.1f} MB | GC2 最大停頓 {sample['gc2_max_ms']:.2f} ms", flush=True)
+
+    def report(self, slope_limit_mb_h=5.0, rising_limit=0.7):
+        """ 成長斜率超過 slope_limit_mb_h 且多數區間上升時，標記為疑似洩漏 """
+        steady = [s for s in self.samples if s["elapsed_h"] * 3600 >= self.warmup] or self.samples
+        times = [s["elapsed_h"] for s in steady]
+        findings = []
+        for key in ("rss_mb", "traced_mb", "gc_objects"):
+            values = [s[key] for s in steady if key in s]
+            slope, rising = growth_trend(times, values)
+            limit = slope_limit_mb_h if key != "gc_objects" else 10000
+            flagged = slope > limit and rising >= rising_limit
+            findings.append({"metric": key, "slope_per_hour": slope, "rising_ratio": rising, "monotonic_growth": flagged})
+        gc_max = {g: max((s[f"gc{g}_max_ms"] for s in self.samples), default=0.0) for g in range(3)}
+        return {
+            "qt": self.qt_app is not None,
+            "samples": len(self.samples),
+            "frames": self.samples[-1]["frames"] if self.samples else 0,
+            "growth": findings,
+            "gc_max_pause_ms": gc_max,
+            "allocation_hotspots": self.hotspots,
+        }
+
+def main():
+    parser = argparse.ArgumentParser(description="長時間記憶體 / GC 浸泡測試")
+    parser.add_argument("--hours", type=float, default=12.0, help="測試時數")
+    parser.add_argument("--source", default="synthetic", help="synthetic 或錄影檔路徑")
+    parser.add_argument("--fps", type=float, default=30.0, help="合成來源幀率 (0 表示全速)")
+    parser.add_argument("--interval", type=float, default=60.0, help="取樣間隔秒數")
+    parser.add_argument("--mode-switch", type=float, default=300.0, help="每隔幾秒切換運動 / 操控模式 (0 停用)")
+    parser.add_argument("--coach-interval", type=float, default=15.0, help="每隔幾秒模擬一次教練請求 (0 停用)")
+    parser.add_argument("--no-qt", action="store_true", help="不使用 Qt (QImage 與 LLMWorker 以 ndarray / threading 近似)")
+    parser.add_argument("--no-trace", action="store_true", help="停用 tracemalloc (降低量測本身的負擔)")
+    parser.add_argument("--trace-frames", type=int, default=1, help="tracemalloc 保留的堆疊深度")
+    parser.add_argument("--out", default=os.path.join(tempfile.gettempdir(), "yoga_soak"), help="報告輸出目錄")
+    args = parser.parse_args()
+
+    qt = not args.no_qt
+    if qt:
+        try:
+            import PyQt6.QtCore
+        except ImportError:
+            print("[Soak] ⚠️ 未安裝 PyQt6，改用 ndarray / threading 近似；QImage 與 QThread 的洩漏不會被量測", flush=True)
+            qt = False
+    source = SyntheticSource(fps=args.fps, realtime=args.fps > 0) if args.source == "synthetic" else LoopingVideoSource(args.source)
+    runner = SoakRunner(
+        source, args.hours, args.interval, "yoga_pose_model_RightFoot.json", "rightfoot.json",
+        mode_switch=args.mode_switch, coach_interval=args.coach_interval, trace=not args.no_trace, trace_frames=args.trace_frames,
+        qt=qt
+    )
+    report = runner.run()
+
+    os.makedirs(args.out, exist_ok=True)
+    with open(os.path.join(args.out, "soak_report.json"), "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    if runner.samples:
+        with open(os.path.join(args.out, "soak_samples.csv"), "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(runner.samples[-1].keys()))
+            writer.writeheader()
+            writer.writerows(runner.samples)
+
+    for g in report["growth"]:
+        mark = "⚠️ 疑似持續成長" if g["monotonic_growth"] else "✅"
+        print(f"[Soak] {g['metric']:<11} 斜率 {g['slope_per_hour']:+10.2f}/小時 | 上升比例 {g['rising_ratio']:.2f} {mark}")
+    for h in report["allocation_hotspots"]:
+        print(f"[Soak] 配置成長 {h['size_diff_kb']:+10.1f} KB ({h['count_diff']:+d} 個) @ {h['location']}")
+    if not report["qt"]:
+        print("[Soak] ⚠️ 本次未使用 Qt：結果不含 to_qimg 副本與 LLMWorker QThread 的配置")
+    print(f"[Soak] 報告已輸出至 {args.out}")
+    return 1 if any(g["monotonic_growth"] for g in report["growth"]) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,3 +1,5 @@
+import os
+
 class SystemState:
     """
     管理全域共享狀態，確保背景運算與介面顯示同步
@@ -9,4 +11,11 @@ class SystemState:
 
     def toggle_mode(self):
         """切換模式"""
-        self.mode = "CONTROL" if self.mode == "EXERCISE" else "EXERCISE"
\ No newline at end of file
+        self.mode = "CONTROL" if self.mode == "EXERCISE" else "EXERCISE"
+
+def user_data_path(*parts):
+    """ 使用者資料目錄 (~/.yoga_coach)，打包後的暫存解壓目錄每次啟動都不同，持久資料一律放這裡 """
+    base = os.path.join(os.path.expanduser("~"), ".yoga_coach")
+    path = os.path.join(base, *parts)
+    os.makedirs(os.path.dirname(path) if parts else path, exist_ok=True)
+    return path
@@ -0,0 +1,195 @@
+import os
+import sys
+import time
+import queue
+import argparse
+import threading
+import multiprocessing as mp
+from core.state import SystemState
+from core.inference_worker import InferenceProcess
+from ai.llm_engine import build_coach_query
+
+def partition_cpus(n_stations):
+    """ 將可用 CPU 核心平均分配給各站點 (回傳每站的核心集合，無法取得時回傳 None) """
+    if not hasattr(os, "sched_getaffinity"):
+        return [None] * n_stations
+    cores = sorted(os.sched_getaffinity(0))
+    if len(cores) < n_stations:
+        # 核心不足時輪流共用
+        return [{cores[i % len(cores)]} for i in range(n_stations)]
+    # 無法整除時餘下的核心依序多分給前幾站，不浪費任何核心
+    size, extra = divmod(len(cores), n_stations)
+    sets = []
+    start = 0
+    for i in range(n_stations):
+        end = start + size + (1 if i < extra else 0)
+        sets.append(set(cores[start:end]))
+        start = end
+    return sets
+
+class CoachDispatcher(threading.Thread):
+    """
+    共享的教練請求佇列：所有站點的請求經權杖桶 (token bucket) 限速後依序送出，
+    等待過久的請求直接丟棄，避免建議與使用者當下動作不符。
+    rate_per_min <= 0 視為停用教練：佇列照常清空 (避免站點塞滿) 但不送出任何請求。
+    """
+    def __init__(self, coach, coach_q, rate_per_min=6.0, burst=2, max_age=10.0, on_advice=None):
+        super().__init__(daemon=True)
+        self.coach = coach
+        self.coach_q = coach_q
+        self.rate = rate_per_min / 60.0
+        self.enabled = rate_per_min > 0
+        self.burst = burst
+        self.tokens = float(burst)
+        self.max_age = max_age
+        self.on_advice = on_advice
+        self.sent = 0
+        self.dropped = 0
+        self._stop_event = threading.Event()
+        self._last_refill = time.time()
+
+    def _take_token(self):
+        """ 阻塞直到取得一個權杖 (或收到停止信號) """
+        while not self._stop_event.is_set():
+            now = time.time()
+            self.tokens = min(self.burst, self.tokens + (now - self._last_refill) * self.rate)
+            self._last_refill = now
+            if self.tokens >= 1.0:
+                self.tokens -= 1.0
+                return True
+            self._stop_event.wait((1.0 - self.tokens) / self.rate)
+        return False
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                station_id, status, landmarks, metrics, ts = self.coach_q.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            # 停用時丟棄；先丟棄已過期的請求，不讓它們消耗權杖
+            if not self.enabled or time.time() - ts > self.max_age:
+                self.dropped += 1
+                continue
+            if not self._take_token():
+                break
+            # 等待權杖期間可能已過期：丟棄並退回權杖
+            if time.time() - ts > self.max_age:
+                self.dropped += 1
+                self.tokens = min(self.burst, self.tokens + 1.0)
+                continue
+
+            res = self.coach.ask(build_coach_query(status, landmarks, metrics)) if self.coach else None
+            self.sent += 1
+            if res and self.on_advice:
+                self.on_advice(station_id, res)
+
+    def stop(self):
+        self._stop_event.set()
+
+class StationManager:
+    """
+    多站點管理器：每個瑜珈墊 (攝影機) 對應一個獨立的推論行程，
+    各自擁有 SystemState、手勢引擎與教練節流；教練請求統一經 CoachDispatcher 限流。
+    """
+    def __init__(self, cameras, model_path, labels_path, coach=None, max_fps=None,
+                 coach_rate_per_min=6.0, stats_interval=2.0):
+        self.ctx = mp.get_context("spawn")
+        self.coach_q = self.ctx.Queue(maxsize=64)
+        self.states = [SystemState() for _ in cameras]
+        for state in self.states:
+            state.mode = "EXERCISE"
+        self.stats = [{"frames": 0, "fps": 0.0, "infer_ms": 0.0, "feedback": "", "advice": ""} for _ in cameras]
+        self.stats_interval = stats_interval
+
+        cpu_sets = partition_cpus(len(cameras))
+        self.workers = [
+            InferenceProcess(
+                model_path, labels_path, camera=cam, headless=True, coach_q=self.coach_q, ctx=self.ctx,
+                station_id=i, cpu_set=cpu_sets[i], max_fps=max_fps, stats_interval=stats_interval
+            )
+            for i, cam in enumerate(cameras)
+        ]
+        self.dispatcher = CoachDispatcher(coach, self.coach_q, rate_per_min=coach_rate_per_min, on_advice=self._on_advice)
+
+    def _on_advice(self, station_id, text):
+        self.stats[station_id]["advice"] = text
+        print(f"[Station {station_id}] 💡 教練建議: {text}", flush=True)
+
+    def start(self):
+        for worker in self.workers:
+            worker.start()
+        self.dispatcher.start()
+
+    def poll(self):
+        """ 處理所有站點的訊息並維持行程存活，回傳是否仍有站點在運作 """
+        for i, worker in enumerate(self.workers):
+            worker.sync_state(self.states[i])
+            worker.ensure_alive()
+            while True:
+                msg = worker.poll(timeout=0.005)
+                if msg is None:
+                    break
+                if msg[0] == "frame":
+                    self.stats[i]["feedback"] = msg[6]
+                elif msg[0] == "stats":
+                    _, frames, fps, infer_ms = msg
+                    self.stats[i]["frames"] += frames
+                    self.stats[i]["fps"] = fps
+                    self.stats[i]["infer_ms"] = infer_ms
+                elif msg[0] == "error":
+                    print(f"[Station {i}] ❌ 錯誤: {msg[1]}", flush=True)
+        return any(not s.stop_signal for s in self.states)
+
+    def report(self):
+        """ 各站點吞吐量報告 """
+        lines = []
+        for i, s in enumerate(self.stats):
+            restarts = self.workers[i].restarts
+            lines.append(
+                f"[Station {i}] FPS: {s['fps']:5.1f} | 推論: {s['infer_ms']:6.1f} ms | "
+                f"總幀數: {s['frames']:7d} | 重啟: {restarts} | {s['feedback']}"
+            )
+        lines.append(f"[Coach] 已送出: {self.dispatcher.sent} | 逾時丟棄: {self.dispatcher.dropped}")
+        return "\n".join(lines)
+
+    def stop(self):
+        for state in self.states:
+            state.stop_signal = True
+        self.dispatcher.stop()
+        for worker in self.workers:
+            worker.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description="多站點瑜珈姿勢辨識")
+    parser.add_argument("--cameras", type=int, nargs="+", default=[0], help="攝影機索引清單，每個索引為一個站點")
+    parser.add_argument("--max-fps", type=float, default=None, help="每站點處理幀率上限")
+    parser.add_argument("--coach-rate", type=float, default=6.0, help="教練請求上限 (次/分鐘，所有站點共用；0 停用教練)")
+    parser.add_argument("--ollama", action="store_true", help="使用本機 Ollama 作為教練")
+    args = parser.parse_args()
+
+    coach = None
+    if args.coach_rate <= 0:
+        print("[Station] ⚠️ --coach-rate <= 0，教練已停用", flush=True)
+    elif args.ollama:
+        from ai.llm_engine import OllamaCoach
+        coach = OllamaCoach()
+
+    manager = StationManager(
+        args.cameras, "yoga_pose_model_RightFoot.json", "rightfoot.json",
+        coach=coach, max_fps=args.max_fps, coach_rate_per_min=args.coach_rate
+    )
+    manager.start()
+    last_report = time.time()
+    try:
+        while manager.poll():
+            if time.time() - last_report >= manager.stats_interval:
+                print(manager.report(), flush=True)
+                last_report = time.time()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        manager.stop()
+
+if __name__ == "__main__":
+    mp.freeze_support()
+    sys.exit(main())
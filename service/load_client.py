@@ -0,0 +1,98 @@
+import sys
+import time
+import asyncio
+import argparse
+import numpy as np
+
+try:
+    import aiohttp
+except ImportError:
+    print("[LoadClient] ❌ 需要 aiohttp：請執行 'pip install aiohttp'")
+    raise
+
+def _random_pose(rng):
+    """ 產生一組合理範圍內的 33 點骨架 (x, y, z, visibility) """
+    pts = rng.uniform(0.2, 0.8, size=(33, 4))
+    pts[:, 3] = 1.0
+    return pts.round(4).tolist()
+
+async def _http_client(session, url, client_id, requests, jpeg, rng, latencies, counters):
+    for _ in range(requests):
+        t0 = time.perf_counter()
+        if jpeg is not None:
+            resp = await session.post(f"{url}/v1/frame", params={"client_id": client_id}, data=jpeg)
+        else:
+            resp = await session.post(f"{url}/v1/landmarks", json={"client_id": client_id, "pose": _random_pose(rng)})
+        async with resp:
+            await resp.read()
+            if resp.status == 200:
+                latencies.append((time.perf_counter() - t0) * 1000)
+                counters["ok"] += 1
+            elif resp.status == 503:
+                counters["rejected"] += 1
+                await asyncio.sleep(float(resp.headers.get("Retry-After", "1")) * 0.1)
+            else:
+                counters["error"] += 1
+
+async def _ws_client(session, url, client_id, requests, jpeg, rng, latencies, counters):
+    async with session.ws_connect(f"{url}/ws", params={"client_id": client_id}) as ws:
+        for _ in range(requests):
+            t0 = time.perf_counter()
+            if jpeg is not None:
+                await ws.send_bytes(jpeg)
+            else:
+                await ws.send_json({"pose": _random_pose(rng)})
+            reply = await ws.receive_json()
+            if "error" in reply:
+                counters["rejected" if reply["error"] == "overloaded" else "error"] += 1
+            else:
+                latencies.append((time.perf_counter() - t0) * 1000)
+                counters["ok"] += 1
+
+async def run_load(url, clients, requests, mode="http", jpeg=None, seed=0):
+    """ 以 clients 個併發客戶端各送出 requests 筆請求，回傳統計結果 """
+    latencies = []
+    counters = {"ok": 0, "rejected": 0, "error": 0}
+    worker = _ws_client if mode == "ws" else _http_client
+    connector = aiohttp.TCPConnector(limit=clients)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        t0 = time.perf_counter()
+        await asyncio.gather(*[
+            worker(session, url, f"bench-{i}", requests, jpeg, np.random.default_rng(seed + i), latencies, counters)
+            for i in range(clients)
+        ])
+        elapsed = time.perf_counter() - t0
+        async with session.get(f"{url}/v1/stats") as resp:
+            server_stats = await resp.json()
+
+    lat = np.array(latencies) if latencies else np.zeros(1)
+    return {
+        "elapsed_s": elapsed,
+        "throughput_rps": counters["ok"] / elapsed if elapsed > 0 else 0.0,
+        "p50_ms": float(np.percentile(lat, 50)),
+        "p95_ms": float(np.percentile(lat, 95)),
+        "p99_ms": float(np.percentile(lat, 99)),
+        **counters,
+        "server": server_stats,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="姿勢分析服務壓力測試")
+    parser.add_argument("--url", default="http://127.0.0.1:8765")
+    parser.add_argument("--clients", type=int, default=32, help="併發客戶端數")
+    parser.add_argument("--requests", type=int, default=200, help="每個客戶端的請求數")
+    parser.add_argument("--mode", choices=("http", "ws"), default="http")
+    parser.add_argument("--jpeg", default=None, help="改送此 JPEG 影格 (測試完整姿勢偵測路徑)")
+    args = parser.parse_args()
+
+    jpeg = open(args.jpeg, "rb").read() if args.jpeg else None
+    r = asyncio.run(run_load(args.url, args.clients, args.requests, args.mode, jpeg))
+    s = r["server"]
+    print(f"[LoadClient] {args.clients} 客戶端 x {args.requests} 請求 ({args.mode})，耗時 {r['elapsed_s']:.2f}s")
+    print(f"[LoadClient] 吞吐量 {r['throughput_rps']:.0f} req/s | 成功 {r['ok']} | 拒絕 {r['rejected']} | 錯誤 {r['error']}")
+    print(f"[LoadClient] 客戶端延遲 p50 {r['p50_ms']:.2f} ms / p95 {r['p95_ms']:.2f} ms / p99 {r['p99_ms']:.2f} ms")
+    print(f"[LoadClient] 服務端延遲 p50 {s['latency_ms']['p50']:.2f} ms / p95 {s['latency_ms']['p95']:.2f} ms，"
+          f"平均批次 {s['avg_batch']:.1f} 筆")
+
+if __name__ == "__main__":
+    sys.exit(main())
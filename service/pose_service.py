@@ -0,0 +1,345 @@
+import sys
+import json
+import time
+import asyncio
+import argparse
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+try:
+    from aiohttp import web, WSMsgType
+except ImportError:
+    print("[Service] ❌ 需要 aiohttp：請執行 'pip install aiohttp'")
+    raise
+
+from ai.models import resource_path, load_labels, points_to_features, with_angle_features, CONFIDENCE_THRESHOLD, ANGLE_MODEL_FEATURES
+from core.gesture_engine import GestureEngine
+from core.coach_throttle import CoachThrottle
+
+class Overloaded(Exception):
+    """ 佇列已滿，請求被拒絕 (背壓) """
+
+class BatchClassifier:
+    """ 只含 XGBoost 的分類器，一次預測整批特徵 """
+    def __init__(self, model_path, labels_path):
+        import xgboost as xgb
+        from ai.artifacts import load_booster
+        self.xgb = xgb
+        self.booster, info = load_booster(resource_path(model_path))
+        print(f"[Service] 📦 模型載入 {info['load_ms']:.1f} ms ({'UBJ 快取' if info['cached'] else '首次轉換'})", flush=True)
+        self.labels = load_labels(resource_path(labels_path))
+        # 以 --angles 訓練的模型需要 48 維 (40 維座標 + 8 個關節角度)
+        self.use_angles = self.booster.num_features() == ANGLE_MODEL_FEATURES
+
+    def predict(self, X):
+        preds = self.booster.predict(self.xgb.DMatrix(X))
+        idx = np.argmax(preds, axis=1)
+        conf = preds[np.arange(len(idx)), idx]
+        results = []
+        for i, c in zip(idx.tolist(), conf.tolist()):
+            label = self.labels.get(i, f"未知動作 (ID:{i})") if c > CONFIDENCE_THRESHOLD else "動作匹配中..."
+            results.append((label, c))
+        return results
+
+class MicroBatcher:
+    """
+    微批次：併發請求先進入有界佇列，累積到 max_batch 筆或等待 max_wait_ms 後合併成一次向量化預測。
+    佇列滿時 submit 立即拋出 Overloaded，由呼叫端回應 503。
+    """
+    def __init__(self, predict_fn, max_batch=64, max_wait_ms=4.0, max_queue=512):
+        self.predict_fn = predict_fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        # XGBoost 推論放在單一背景執行緒，不阻塞事件迴圈
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="xgb")
+        self.batches = 0
+        self.items = 0
+
+    async def submit(self, features):
+        fut = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait((features, fut))
+        except asyncio.QueueFull:
+            raise Overloaded()
+        return await fut
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                # 先取走已在佇列中的請求，再等待剩餘時間
+                try:
+                    batch.append(self.queue.get_nowait())
+                    continue
+                except asyncio.QueueEmpty:
+                    pass
+                remain = deadline - loop.time()
+                if remain <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), remain))
+                except asyncio.TimeoutError:
+                    break
+
+            X = np.stack([f for f, _ in batch])
+            try:
+                results = await loop.run_in_executor(self.executor, self.predict_fn, X)
+            except Exception as e:
+                for _, fut in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+                continue
+            self.batches += 1
+            self.items += len(batch)
+            for (_, fut), res in zip(batch, results):
+                if not fut.done():
+                    fut.set_result(res)
+
+class FramePoseExtractor:
+    """ JPEG 影格 -> 33 個關鍵點；每個執行緒持有自己的 MediaPipe Pose (static_image_mode，各客戶端互不干擾) """
+    def __init__(self, workers=2):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pose")
+        self._local = threading.local()
+
+    def _extract(self, jpeg_bytes):
+        import cv2
+        import mediapipe as mp
+        pose = getattr(self._local, "pose", None)
+        if pose is None:
+            pose = self._local.pose = mp.solutions.pose.Pose(static_image_mode=True, model_complexity=1)
+        frame = cv2.imdecode(np.frombuffer(jpeg_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if frame is None:
+            raise ValueError("無法解碼 JPEG")
+        results = pose.process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+        if not results.pose_landmarks:
+            return None
+        return np.array([[lm.x, lm.y, lm.z, lm.visibility] for lm in results.pose_landmarks.landmark], dtype=np.float32)
+
+    async def extract(self, jpeg_bytes):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, self._extract, jpeg_bytes)
+
+def _as_hand_points(hand):
+    """ 單手 21x[x,y,...] 或多手 Hx21x[x,y,...] -> (H, 21, 2) 陣列，供 GestureEngine.update 使用 """
+    points = np.asarray(hand, dtype=np.float32)
+    if points.ndim == 2:
+        points = points[None]
+    if points.ndim != 3 or points.shape[1] != 21 or points.shape[2] < 2:
+        raise ValueError("hand 需為 21 個關鍵點 (或多手的陣列)")
+    return points[:, :, :2]
+
+class ClientSession:
+    """ 每個客戶端 (瑜珈墊平板) 各自的手勢狀態與教練節流 """
+    def __init__(self, coach_cooldown):
+        self.gesture = GestureEngine(debug=False)
+        self.throttle = CoachThrottle(coach_cooldown)
+        self.last_seen = time.time()
+
+class PoseService:
+    """
+    本機姿勢分析服務
+    - POST /v1/landmarks : JSON {client_id, pose: 33x[x,y,...] 或 features: 40 維, hand: 21x[x,y,z] 或多手 Hx21x[x,y,z], page}
+    - POST /v1/frame?client_id=&page= : JPEG 影格
+    - GET  /ws?client_id= : WebSocket，文字訊息同 /v1/landmarks，二進位訊息為 JPEG
+    - GET  /v1/stats : 延遲、批次與背壓統計
+    """
+    def __init__(self, model_path, labels_path, max_batch=64, max_wait_ms=4.0, max_queue=512,
+                 frame_workers=2, max_frames_in_flight=8, coach_cooldown=15.0, session_ttl=600.0):
+        self.classifier = BatchClassifier(model_path, labels_path)
+        self.batcher = None
+        self.batch_args = (max_batch, max_wait_ms, max_queue)
+        self.frames = FramePoseExtractor(frame_workers)
+        self.frame_slots = None
+        self.max_frames_in_flight = max_frames_in_flight
+        self.coach_cooldown = coach_cooldown
+        self.session_ttl = session_ttl
+        self.sessions = {}
+        self.latencies = deque(maxlen=2000)
+        self.rejected = 0
+        self.requests = 0
+
+    # --- 生命週期 ---
+    async def _on_startup(self, app):
+        self.batcher = MicroBatcher(self.classifier.predict, *self.batch_args)
+        self.frame_slots = asyncio.Semaphore(self.max_frames_in_flight)
+        app["batch_task"] = asyncio.create_task(self.batcher.run())
+        app["gc_task"] = asyncio.create_task(self._expire_sessions())
+
+    async def _on_cleanup(self, app):
+        for key in ("batch_task", "gc_task"):
+            app[key].cancel()
+        self.batcher.executor.shutdown(wait=False)
+        self.frames.executor.shutdown(wait=False)
+
+    async def _expire_sessions(self):
+        while True:
+            await asyncio.sleep(60)
+            cutoff = time.time() - self.session_ttl
+            for cid in [c for c, s in self.sessions.items() if s.last_seen < cutoff]:
+                del self.sessions[cid]
+
+    def _session(self, client_id):
+        session = self.sessions.get(client_id)
+        if session is None:
+            session = self.sessions[client_id] = ClientSession(self.coach_cooldown)
+        session.last_seen = time.time()
+        return session
+
+    # --- 核心分析 ---
+    async def analyze(self, client_id, points=None, features=None, hand=None, page="HomePage"):
+        """ 分類姿勢並更新該客戶端的手勢 / 教練狀態 """
+        t0 = time.perf_counter()
+        session = self._session(client_id)
+        result = {"client_id": client_id, "label": None, "confidence": 0.0, "coach_due": False, "gesture_cmd": None}
+
+        if features is None and points is not None:
+            points = np.asarray(points, dtype=np.float32)
+            if points.ndim != 2 or points.shape[0] < 33 or points.shape[1] < 2:
+                raise ValueError("pose 需為 33 個 [x, y, ...] 關鍵點")
+            features = points_to_features(points)
+        if features is not None:
+            features = np.asarray(features, dtype=np.float32).reshape(-1)
+            if features.shape[0] != 40:
+                raise ValueError("features 必須為 40 維")
+            if self.classifier.use_angles:
+                features = with_angle_features(features)
+            label, conf = await self.batcher.submit(features)
+            result["label"], result["confidence"] = label, conf
+            # 有特徵即代表有座標數據
+            if session.throttle.should_trigger(label, True):
+                session.throttle.mark(label)
+                result["coach_due"] = True
+
+        if hand is not None:
+            result["gesture_cmd"], _ = session.gesture.update(_as_hand_points(hand), page)
+
+        latency = (time.perf_counter() - t0) * 1000
+        self.latencies.append(latency)
+        self.requests += 1
+        result["latency_ms"] = round(latency, 3)
+        return result
+
+    async def analyze_frame(self, client_id, jpeg_bytes, page="HomePage"):
+        if self.frame_slots.locked():
+            raise Overloaded()
+        async with self.frame_slots:
+            t0 = time.perf_counter()
+            points = await self.frames.extract(jpeg_bytes)
+        if points is None:
+            return {"client_id": client_id, "label": "請進入畫面", "confidence": 0.0, "coach_due": False,
+                    "gesture_cmd": None, "latency_ms": round((time.perf_counter() - t0) * 1000, 3)}
+        result = await self.analyze(client_id, points=points, page=page)
+        result["latency_ms"] = round((time.perf_counter() - t0) * 1000, 3)
+        return result
+
+    # --- HTTP / WebSocket ---
+    def _overloaded(self):
+        self.rejected += 1
+        return web.json_response({"error": "overloaded"}, status=503, headers={"Retry-After": "1"})
+
+    async def handle_landmarks(self, request):
+        try:
+            body = await request.json()
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            return web.json_response({"error": "invalid json"}, status=400)
+        if not isinstance(body, dict):
+            return web.json_response({"error": "json body must be an object"}, status=400)
+        try:
+            result = await self.analyze(
+                body.get("client_id", request.remote), body.get("pose"), body.get("features"),
+                body.get("hand"), body.get("page", "HomePage")
+            )
+        except Overloaded:
+            return self._overloaded()
+        except (ValueError, TypeError) as e:
+            return web.json_response({"error": str(e)}, status=400)
+        return web.json_response(result)
+
+    async def handle_frame(self, request):
+        data = await request.read()
+        try:
+            result = await self.analyze_frame(
+                request.query.get("client_id", request.remote), data, request.query.get("page", "HomePage")
+            )
+        except Overloaded:
+            return self._overloaded()
+        except ValueError as e:
+            return web.json_response({"error": str(e)}, status=400)
+        return web.json_response(result)
+
+    async def handle_ws(self, request):
+        ws = web.WebSocketResponse(max_msg_size=8 * 1024 * 1024)
+        await ws.prepare(request)
+        client_id = request.query.get("client_id", request.remote)
+        page = "HomePage"
+        async for msg in ws:
+            try:
+                if msg.type == WSMsgType.TEXT:
+                    body = json.loads(msg.data)
+                    if not isinstance(body, dict):
+                        raise ValueError("json body must be an object")
+                    page = body.get("page", page)
+                    result = await self.analyze(client_id, body.get("pose"), body.get("features"), body.get("hand"), page)
+                elif msg.type == WSMsgType.BINARY:
+                    result = await self.analyze_frame(client_id, msg.data, page)
+                else:
+                    continue
+            except Overloaded:
+                self.rejected += 1
+                result = {"error": "overloaded"}
+            except (ValueError, TypeError) as e:
+                result = {"error": str(e)}
+            await ws.send_json(result)
+        return ws
+
+    def stats(self):
+        lat = np.array(self.latencies) if self.latencies else np.zeros(1)
+        return {
+            "requests": self.requests,
+            "rejected": self.rejected,
+            "clients": len(self.sessions),
+            "queue_depth": self.batcher.queue.qsize() if self.batcher else 0,
+            "batches": self.batcher.batches if self.batcher else 0,
+            "avg_batch": (self.batcher.items / self.batcher.batches) if self.batcher and self.batcher.batches else 0.0,
+            "latency_ms": {
+                "p50": float(np.percentile(lat, 50)),
+                "p95": float(np.percentile(lat, 95)),
+                "p99": float(np.percentile(lat, 99)),
+            },
+        }
+
+    async def handle_stats(self, request):
+        return web.json_response(self.stats())
+
+    def make_app(self):
+        app = web.Application(client_max_size=8 * 1024 * 1024)
+        app.router.add_post("/v1/landmarks", self.handle_landmarks)
+        app.router.add_post("/v1/frame", self.handle_frame)
+        app.router.add_get("/v1/stats", self.handle_stats)
+        app.router.add_get("/ws", self.handle_ws)
+        app.on_startup.append(self._on_startup)
+        app.on_cleanup.append(self._on_cleanup)
+        return app
+
+def main():
+    parser = argparse.ArgumentParser(description="本機瑜珈姿勢分析服務")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--max-batch", type=int, default=64, help="單次向量化預測的最大筆數")
+    parser.add_argument("--max-wait-ms", type=float, default=4.0, help="湊批次的最長等待時間")
+    parser.add_argument("--max-queue", type=int, default=512, help="待處理請求上限 (超過回應 503)")
+    args = parser.parse_args()
+
+    service = PoseService(
+        "yoga_pose_model_RightFoot.json", "rightfoot.json",
+        max_batch=args.max_batch, max_wait_ms=args.max_wait_ms, max_queue=args.max_queue
+    )
+    print(f"[Service] 🚀 姿勢分析服務啟動於 http://127.0.0.1:{args.port}", flush=True)
+    # 僅綁定本機位址
+    web.run_app(service.make_app(), host="127.0.0.1", port=args.port, print=None)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,6 +4,50 @@ from PyQt6.QtCore import Qt, QPropertyAnimation, QPoint, QEasingCurve, QTimer, Q
 from PyQt6.QtGui import QPixmap, QFont, QPainter, QColor, QPen
 import time
 
+# 提示列與狀態文字樣式：依模式 / 狀態預先計算，update_status 只在樣式真正改變時才套用
+HINT_BAR_STYLES = {
+    "INIT": "background-color: rgba(0,0,0,200); border-radius: 45px; border: 1px solid rgba(255,255,255,40);",
+    "EXERCISE": "background-color: rgba(16, 185, 129, 180); border: 2px solid #10b981; border-radius: 45px;",
+    "ACTIVE": "background-color: rgba(59, 130, 246, 180); border: 2px solid #3b82f6; border-radius: 45px;",
+    "IDLE": "background-color: rgba(0, 0, 0, 200); border: 1px solid rgba(255, 255, 255, 40); border-radius: 45px;",
+    "COACH": """
+            background-color: rgba(6, 78, 59, 230); 
+            border: 3px solid #fbbf24; 
+            border-radius: 45px;
+        """,
+}
+STATUS_TEXT_STYLES = {
+    "NORMAL": "color: white; font-weight: normal; font-size: 14px;",
+    "COACH": "color: #fbbf24; font-weight: bold; font-size: 16px;",  # 金色字體
+}
+
+# FPS 文字是給人看的，每秒更新兩次即可；逐幀改字只會多出重繪
+FPS_LABEL_INTERVAL = 0.5
+
+class FrameTimer:
+    """
+    GUI 執行緒耗時統計：量測指定區段的執行時間，每隔 interval 秒輸出平均 / p95 / 最大值
+    """
+    def __init__(self, name, interval=10.0):
+        self.name = name
+        self.interval = interval
+        self.samples = []
+        self._window_start = time.perf_counter()
+
+    def start(self):
+        return time.perf_counter()
+
+    def stop(self, t0):
+        now = time.perf_counter()
+        self.samples.append((now - t0) * 1000)
+        if now - self._window_start >= self.interval and self.samples:
+            ordered = sorted(self.samples)
+            avg = sum(ordered) / len(ordered)
+            p95 = ordered[int(len(ordered) * 0.95) - 1] if len(ordered) >= 20 else ordered[-1]
+            print(f"[UI Timing] {self.name}: 平均 {avg:.3f} ms | p95 {p95:.3f} ms | 最大 {ordered[-1]:.3f} ms | {len(ordered)} 次", flush=True)
+            self.samples = []
+            self._window_start = now
+
 class HoverButton(QFrame):
     """
     具有環形進度條的懸浮按鈕
@@ -16,6 +60,8 @@ class HoverButton(QFrame):
         self.setStyleSheet("background: transparent;")
 
     def set_progress(self, val):
+        if val == self.progress:
+            return
         self.progress = val
         self.update()
 
@@ -61,6 +107,12 @@ class GlassBoard(QFrame):
         self.title_label.setStyleSheet(f"color: {color_code};")
         self.title_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
         layout.addWidget(self.title_label)
+
+        self.content_label = QLabel("")
+        self.content_label.setFont(QFont("Microsoft JhengHei", 15))
+        self.content_label.setStyleSheet("color: rgba(255, 255, 255, 220);")
+        self.content_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        layout.addWidget(self.content_label, 1)
         
         self.desc_label = QLabel("空間計算板塊已拉入\n[ 手勢反向揮動可將此板塊推回邊緣 ]")
         self.desc_label.setFont(QFont("Microsoft JhengHei", 14))
@@ -69,10 +121,19 @@ class GlassBoard(QFrame):
         layout.addWidget(self.desc_label)
         layout.addStretch()
 
+    def set_content(self, text):
+        self.content_label.setText(text)
+
 class MainUI(QMainWindow):
-    def __init__(self, state):
+    def __init__(self, state, diff_updates=True, history=None, ui_timing=False):
+        """
+        diff_updates: 只更新有變化的元件 (關閉時每幀全部重設，用於對照 GUI 執行緒耗時)
+        ui_timing: 每 10 秒輸出 update_status 耗時統計 (對照量測用，平常不輸出)
+        history: HistoryStore，提供訓練計畫與數據中心板塊的內容
+        """
         super().__init__()
         self.state = state
+        self.history = history
         self.setWindowTitle("Spatial UI Framework v15.5")
         self.setMinimumSize(1200, 850)
         self.setStyleSheet("background-color: black;")
@@ -85,6 +146,19 @@ class MainUI(QMainWindow):
         self.coach_advice_active = False # 標記目前是否正在顯示教練建議
         self.coach_advice_text = ""
 
+        # --- 介面 view-model：記錄最後一次套用到元件的值，相同則跳過 ---
+        self.diff_updates = diff_updates
+        self._applied = {}
+        self._refresh_s = None       # 螢幕刷新間隔 (秒)，信箱輪詢用
+        self._last_fps_update = 0.0
+        self.status_timer = FrameTimer("update_status") if ui_timing else None
+
+        # --- 影格結果信箱 (attach_mailbox 後以螢幕刷新率輪詢) ---
+        self.mailbox = None
+        self.on_frame = None
+        self.poll_timer = None
+        self._vt_mode = None
+
         # --- 1. 背景與影像 ---
         self.video_bg = QLabel(self)
         self.video_bg.setGeometry(0, 0, 1200, 850)
@@ -123,14 +197,10 @@ class MainUI(QMainWindow):
         self.coach_advice_text = text
         
         # 2. 立即更新 UI 視覺 (使用顯眼的金色/亮綠色)
-        self.status_icon.setText("💡")
-        self.status_text.setText(f"教練建議：{text}")
-        self.status_text.setStyleSheet("color: #fbbf24; font-weight: bold; font-size: 16px;") # 金色字體
-        self.hint_bar.setStyleSheet("""
-            background-color: rgba(6, 78, 59, 230); 
-            border: 3px solid #fbbf24; 
-            border-radius: 45px;
-        """)
+        self._apply("icon", self.status_icon.setText, "💡")
+        self._apply("text", self.status_text.setText, f"教練建議：{text}")
+        self._apply("text_style", self.status_text.setStyleSheet, STATUS_TEXT_STYLES["COACH"])
+        self._apply("hint_style", self.hint_bar.setStyleSheet, HINT_BAR_STYLES["COACH"])
         
         # 3. 8 秒後自動恢復普通狀態顯示
         QTimer.singleShot(8000, self.reset_coach_status)
@@ -138,20 +208,77 @@ class MainUI(QMainWindow):
     def reset_coach_status(self):
         """ 恢復一般狀態顯示 """
         self.coach_advice_active = False
-        self.status_text.setStyleSheet("color: white; font-weight: normal; font-size: 14px;")
+        self._apply("text_style", self.status_text.setStyleSheet, STATUS_TEXT_STYLES["NORMAL"])
         # 顏色會由 update_status 下一次循環時根據模式自動修正
 
     def setup_hint_bar(self):
         self.hint_bar = QFrame(self)
         self.hint_bar.setFixedSize(800, 90)
-        self.hint_bar.setStyleSheet("background-color: rgba(0,0,0,200); border-radius: 45px; border: 1px solid rgba(255,255,255,40);")
         layout = QHBoxLayout(self.hint_bar)
-        self.status_icon = QLabel("👤"); self.status_icon.setFont(QFont("Segoe UI Emoji", 20))
-        self.status_text = QLabel("初始化系統..."); self.status_text.setFont(QFont("Microsoft JhengHei", 14))
-        self.fps_label = QLabel("FPS: 0.0")
+        self.status_icon = QLabel(); self.status_icon.setFont(QFont("Segoe UI Emoji", 20))
+        self.status_text = QLabel(); self.status_text.setFont(QFont("Microsoft JhengHei", 14))
+        self.fps_label = QLabel()
         layout.addWidget(self.status_icon); layout.addWidget(self.status_text, 1); layout.addWidget(self.fps_label)
+        self._apply("hint_style", self.hint_bar.setStyleSheet, HINT_BAR_STYLES["INIT"])
+        self._apply("icon", self.status_icon.setText, "👤")
+        self._apply("text", self.status_text.setText, "初始化系統...")
+        self._apply("fps", self.fps_label.setText, "FPS: 0.0")
         self.update_hint_pos()
 
+    def _apply(self, key, setter, value):
+        """ 僅在值與上次套用不同時才呼叫 Qt setter (setStyleSheet 會觸發整個元件重新 polish) """
+        if self.diff_updates and self._applied.get(key) == value:
+            return
+        self._applied[key] = value
+        setter(value)
+
+    def _refresh_interval(self):
+        """ 螢幕刷新間隔 (秒)，取不到時以 60 Hz 計 """
+        if self._refresh_s is None:
+            screen = self.screen()
+            rate = screen.refreshRate() if screen else 60.0
+            self._refresh_s = 1.0 / rate if rate > 0 else 1.0 / 60
+        return self._refresh_s
+
+    def attach_mailbox(self, mailbox, on_frame=None):
+        """
+        以螢幕刷新率輪詢 LatestMailbox：每次重繪只取最新一筆 FrameResult，
+        GUI 落後時舊結果已在信箱中被覆寫，不會在事件佇列中排隊。
+        on_frame: 畫面更新後再交給呼叫端的回呼 (教練觸發、歷史紀錄)
+        """
+        self.mailbox = mailbox
+        self.on_frame = on_frame
+        self.poll_timer = QTimer(self)
+        self.poll_timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self.poll_timer.timeout.connect(self.poll_frame)
+        self.poll_timer.start(max(1, int(self._refresh_interval() * 1000)))
+
+    def poll_frame(self):
+        result = self.mailbox.take()
+        if result is None:
+            return
+        if result.raw_image is not None:
+            self.update_video(result.raw_image)
+        if result.vt_image is not None:
+            self.update_vtuber(result.vt_image)
+        elif result.mode != self._vt_mode:
+            # 離開運動模式時 VTuber 畫布清為黑底，之後不再逐幀繪製
+            blank = QPixmap(self.vt_view.size())
+            blank.fill(Qt.GlobalColor.black)
+            self.vt_view.setPixmap(blank)
+        self._vt_mode = result.mode
+        self.update_status(result.is_active, result.fps, result.feedback, result.hand_x, result.hand_y)
+        if self.on_frame:
+            self.on_frame(result)
+
+    def _update_fps(self, fps):
+        """ FPS 文字每 FPS_LABEL_INTERVAL 秒更新一次 """
+        now = time.monotonic()
+        if self.diff_updates and now - self._last_fps_update < FPS_LABEL_INTERVAL:
+            return
+        self._last_fps_update = now
+        self._apply("fps", self.fps_label.setText, f"FPS: {fps:.1f}")
+
     def update_m_btn_pos(self):
         self.m_button.move(self.width() - 150, 50)
 
@@ -159,11 +286,19 @@ class MainUI(QMainWindow):
         self.state.toggle_mode()
         if self.state.mode == "EXERCISE" and self.active_board:
             self.animate_back()
-        self.status_text.setText(f"已切換至: {'運動模式' if self.state.mode == 'EXERCISE' else '操控模式'}")
+        self._apply("text", self.status_text.setText, f"已切換至: {'運動模式' if self.state.mode == 'EXERCISE' else '操控模式'}")
 
     def update_status(self, is_active, fps, feedback, hand_x, hand_y):
-        """ 核心偵測邏輯 """
-        self.fps_label.setText(f"FPS: {fps:.1f}")
+        """ 核心偵測邏輯 (每幀呼叫，只更新有變化的元件) """
+        if self.status_timer is None:
+            self._update_status(is_active, fps, feedback, hand_x, hand_y)
+            return
+        t0 = self.status_timer.start()
+        self._update_status(is_active, fps, feedback, hand_x, hand_y)
+        self.status_timer.stop(t0)
+
+    def _update_status(self, is_active, fps, feedback, hand_x, hand_y):
+        self._update_fps(fps)
         
         # --- 若正在顯示教練建議，則跳過一般的文字更新，直到時間結束 ---
         if self.coach_advice_active:
@@ -188,17 +323,15 @@ class MainUI(QMainWindow):
 
         # 根據模式更新提示列外觀
         if self.state.mode == "EXERCISE":
-            self.status_icon.setText("🏃")
-            self.status_text.setText(f"運動模式 | {feedback}")
-            self.hint_bar.setStyleSheet("background-color: rgba(16, 185, 129, 180); border: 2px solid #10b981; border-radius: 45px;")
+            icon, text, style = "🏃", f"運動模式 | {feedback}", "EXERCISE"
         else:
-            self.status_icon.setText("✊" if is_active else "🖐")
             prefix = "【感應中】" if is_active else "遠距操控模式"
-            self.status_text.setText(f"{prefix} | {feedback if feedback else '手部懸停 M 鍵切換模式'}")
-            if is_active:
-                self.hint_bar.setStyleSheet("background-color: rgba(59, 130, 246, 180); border: 2px solid #3b82f6; border-radius: 45px;")
-            else:
-                self.hint_bar.setStyleSheet("background-color: rgba(0, 0, 0, 200); border: 1px solid rgba(255, 255, 255, 40); border-radius: 45px;")
+            icon = "✊" if is_active else "🖐"
+            text = f"{prefix} | {feedback if feedback else '手部懸停 M 鍵切換模式'}"
+            style = "ACTIVE" if is_active else "IDLE"
+        self._apply("icon", self.status_icon.setText, icon)
+        self._apply("text", self.status_text.setText, text)
+        self._apply("hint_style", self.hint_bar.setStyleSheet, HINT_BAR_STYLES[style])
 
     def reset_board_locations(self):
         w, h = self.width(), self.height()
@@ -220,6 +353,7 @@ class MainUI(QMainWindow):
         if self.active_board: self.animate_back(silent=True)
         target = self.boards.get(direction)
         if not target: return
+        self.refresh_board(direction)
         target.raise_(); self.active_board = direction; self.state.current_page = f"{direction}Page"
         self.pull_group = QParallelAnimationGroup()
         move = QPropertyAnimation(target, b"pos")
@@ -230,6 +364,30 @@ class MainUI(QMainWindow):
         blur.setDuration(600); blur.setEndValue(25.0); self.pull_group.addAnimation(blur)
         self.pull_group.start()
 
+    def refresh_board(self, direction):
+        """ 拉入板塊前從歷史資料庫讀取內容 (只查每日彙總表，毫秒內完成) """
+        if self.history is None:
+            return
+        if direction == "Calendar":
+            lt = time.localtime()
+            days = self.history.calendar(lt.tm_year, lt.tm_mon)
+            if not days:
+                self.boards["Calendar"].set_content("本月尚無訓練紀錄")
+                return
+            lines = [f"{d[5:]}  ● {r['session_seconds'] / 60:.0f} 分鐘 | 停留 {r['holds']} 次" for d, r in days.items()]
+            total = sum(r["session_seconds"] for r in days.values()) / 60
+            self.boards["Calendar"].set_content("\n".join(lines[-8:] + [f"本月共 {len(days)} 天，{total:.0f} 分鐘"]))
+        elif direction == "Data":
+            summary = self.history.label_summary(days=7)
+            if not summary:
+                self.boards["Data"].set_content("近 7 天尚無姿勢停留紀錄")
+                return
+            lines = [f"{label}：{holds} 次，共 {secs:.0f} 秒，最長 {best:.1f} 秒" for label, holds, secs, best in summary[:5]]
+            advice = self.history.recent_advice(1)
+            if advice:
+                lines.append(f"\n💡 最近建議：{advice[0][2]}")
+            self.boards["Data"].set_content("\n".join(["近 7 天姿勢統計"] + lines))
+
     def animate_back(self, silent=False):
         if not self.active_board: return
         target = self.boards[self.active_board]; direction = self.active_board
@@ -247,8 +405,9 @@ class MainUI(QMainWindow):
             clear_blur.setDuration(500); clear_blur.setEndValue(0.0); self.back_group.addAnimation(clear_blur)
         self.back_group.start()
 
-    def update_video(self, qimg): self.video_bg.setPixmap(QPixmap.fromImage(qimg.copy()))
-    def update_vtuber(self, qimg): self.vt_view.setPixmap(QPixmap.fromImage(qimg.copy()))
+    # FrameResult 的 QImage 已獨立持有記憶體且不會再被寫入，不需再複製一次
+    def update_video(self, qimg): self.video_bg.setPixmap(QPixmap.fromImage(qimg))
+    def update_vtuber(self, qimg): self.vt_view.setPixmap(QPixmap.fromImage(qimg))
     def update_hint_pos(self): self.hint_bar.move((self.width() - 800) // 2, self.height() - 120)
     def resizeEvent(self, event):
         self.video_bg.setGeometry(0, 0, self.width(), self.height())